@@ -0,0 +1,69 @@
+"""Per-test overhead of the built-in DiffChecker compared to starting GNU diff for every test.
+
+Usage: python benchmarks/diff_checker.py [--tests N] [--lines L]
+"""
+import argparse
+import os.path
+import random
+import subprocess
+import tempfile
+import time
+
+from etp.common.test import Test
+from etp.testing.testing_context import DiffChecker
+
+
+def subprocess_diff(answer_path: str, output_path: str) -> bool:
+    # what DiffChecker used to do
+    return subprocess.run(["diff", "-q", "--ignore-trailing-space", "--strip-trailing-cr",
+                           answer_path, output_path], stdout=subprocess.DEVNULL).returncode == 0
+
+
+def make_files(directory: str, n_tests: int, n_lines: int):
+    random.seed(0)
+    pairs = []
+    for i in range(n_tests):
+        answer = "".join(f"{random.randint(0, 10 ** 9)}\n" for _ in range(n_lines))
+        # identical (the usual correct solution), different whitespace, and a wrong answer
+        output = [answer, answer.replace("\n", " \r\n"), answer + "1\n"][i % 3]
+        answer_path = os.path.join(directory, f"answer{i}.txt")
+        output_path = os.path.join(directory, f"output{i}.txt")
+        with open(answer_path, "w") as f:
+            f.write(answer)
+        with open(output_path, "w", newline="") as f:
+            f.write(output)
+        pairs.append((answer_path, output_path))
+    return pairs
+
+
+def measure(name: str, compare, pairs) -> float:
+    start = time.perf_counter()
+    for answer_path, output_path in pairs:
+        compare(answer_path, output_path)
+    per_test_us = 1e6 * (time.perf_counter() - start) / len(pairs)
+    print(f"{name:>20}: {per_test_us:10.1f} us per test")
+    return per_test_us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tests", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=10)
+    args = parser.parse_args()
+
+    checker = DiffChecker()
+    with tempfile.TemporaryDirectory() as directory:
+        pairs = make_files(directory, args.tests, args.lines)
+
+        for answer_path, output_path in pairs:
+            test = Test(0, "", answer_path)
+            assert (checker.execute_checker(test, output_path).verdict == 1.0) == subprocess_diff(answer_path, output_path)
+
+        print(f"{args.tests} tests, {args.lines} lines each")
+        diff_us = measure("diff subprocess", subprocess_diff, pairs)
+        builtin_us = measure("built-in", lambda a, o: checker.execute_checker(Test(0, "", a), o), pairs)
+        print(f"{'speedup':>20}: {diff_us / builtin_us:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Time spent in etp itself (hashing, sqlite, starting processes, comparing outputs, rendering the tables)
+rather than in the solutions, on a synthetic task with trivial solutions.
+
+The commands (generate, run, run -c, geninfo) are timed end to end in a separate process, and each phase
+is timed on its own in this process. Results are saved as JSON, so that versions can be compared:
+
+Usage: python benchmarks/etp_overhead.py [--tests N] [--checker] [--batchmanager] [--repeat R]
+                                         [--save FILE] [--compare FILE]
+"""
+import argparse
+import json
+import os.path
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from importlib.metadata import version, PackageNotFoundError
+from typing import Callable, Dict, List
+
+from tabulate import tabulate
+
+import etp.common.compile_cache as compile_cache
+from etp.common.compile import compile_solution
+from etp.common.process import run_process
+from etp.common.run import run_solution
+from etp.common.solution_descriptor import get_solution_descriptor
+from etp.common.solution_language import get_supported_solution_languages
+from etp.common.workspace import WorkspacePool
+from etp.config.parse_genfile import parse_genfile
+from etp.config.task_config import TaskConfig
+from etp.print_utils import set_verbose
+from etp.testing.cache.cache import Cache
+from etp.testing.cache.hashing import hash_file, hash_string
+from etp.testing.test_result import TestResult
+from etp.testing.test_result_tracker import TestResultTracker
+from etp.testing.test_solutions import create_table, create_subtask_table, get_scorer
+from etp.testing.testing_context import DiffChecker
+
+TESTS_PER_GROUP = 10
+
+SOLUTION_C = r"""#include <stdio.h>
+#include <unistd.h>
+
+int main(void) {
+    if (access("input.txt", F_OK) == 0) {  /* run through the batchmanager */
+        freopen("input.txt", "r", stdin);
+        freopen("output.txt", "w", stdout);
+    }
+    long long x;
+    scanf("%lld", &x);
+    printf("%lld\n", 2 * x);
+    return 0;
+}
+"""
+
+SOLUTION_PY = """import os.path
+import sys
+
+if os.path.exists("input.txt"):  # run through the batchmanager
+    sys.stdin = open("input.txt")
+    sys.stdout = open("output.txt", "w")
+print(2 * int(input()))
+"""
+
+# CMS style: checker <input> <correct output> <output>, score on stdout, message on stderr
+CHECKER_C = r"""#include <stdio.h>
+
+int main(int argc, char **argv) {
+    long long expected = 0, actual = -1;
+    FILE *answer = fopen(argv[2], "r"), *output = fopen(argv[3], "r");
+    fscanf(answer, "%lld", &expected);
+    if (fscanf(output, "%lld", &actual) == 1 && actual == expected) {
+        printf("1.0\n");
+        fprintf(stderr, "OK\n");
+    } else {
+        printf("0.0\n");
+        fprintf(stderr, "wrong answer\n");
+    }
+    return 0;
+}
+"""
+
+# only adds the extra process, the solutions read and write the files themselves
+BATCHMANAGER = """#!/bin/sh
+shift 2
+exec "$@"
+"""
+
+
+def get_solutions() -> List[str]:
+    # the Python solution needs the configured interpreter (/bin/pypy3 by default), which may not be installed
+    solutions = ["sol.c"]
+    python = get_supported_solution_languages().get(".py")
+    if python is not None and shutil.which(python.execute_command[0]):
+        solutions.append("sol.py")
+    else:
+        print("WARN: the Python interpreter from ~/.etp/languages.json was not found, only sol.c is run")
+    return solutions
+
+
+def make_task(directory: str, n_tests: int, solutions: List[str], checker: bool, batchmanager: bool):
+    for subdirectory in ["gen", "solution", "check"]:
+        os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+
+    with open(os.path.join(directory, "gen", "GEN"), "w") as f:
+        for i in range(n_tests):
+            if i % TESTS_PER_GROUP == 0:
+                f.write(f"# ST: {TESTS_PER_GROUP}\n")
+            f.write(f"echo {i} > %i\n")
+
+    with open(os.path.join(directory, "solution", "sol.c"), "w") as f:
+        f.write(SOLUTION_C)
+    with open(os.path.join(directory, "solution", "sol.py"), "w") as f:
+        f.write(SOLUTION_PY)
+
+    config = ["name: overhead", "time_limit: 1", "memory_limit: 256", "score_type: GroupSum",
+              "model_solution: solution/sol.c", f"n_input: {n_tests}",
+              "solutions:"] + [f" - solution/{name}" for name in solutions]
+    if batchmanager:
+        config += ["infile: input.txt", "outfile: output.txt"]
+        path = os.path.join(directory, "check", "batchmanager")
+        with open(path, "w") as f:
+            f.write(BATCHMANAGER)
+        os.chmod(path, 0o755)
+    with open(os.path.join(directory, "task.yaml"), "w") as f:
+        f.write("\n".join(config) + "\n")
+
+    if checker:
+        with open(os.path.join(directory, "check", "checker.c"), "w") as f:
+            f.write(CHECKER_C)
+        with open(os.path.join(directory, "check", "Makefile"), "w") as f:
+            f.write("checker: checker.c\n\tgcc -O2 -o checker checker.c\n")
+
+
+def make_home(directory: str) -> Dict[str, str]:
+    # a separate home, so that the compile cache (~/.etp/cache/compile) starts empty and the user's isn't touched;
+    # the language configuration is kept
+    home = os.path.join(directory, "home")
+    os.makedirs(os.path.join(home, ".etp"))
+    languages = os.path.expanduser(os.path.join("~", ".etp", "languages.json"))
+    if os.path.exists(languages):
+        shutil.copy(languages, os.path.join(home, ".etp", "languages.json"))
+    return dict(os.environ, HOME=home)
+
+
+def measure(function: Callable[[], None], repeat: int, setup: Callable[[], None] = None) -> float:
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def etp(task_dir: str, env: Dict[str, str], *args: str):
+    subprocess.run([sys.executable, "-m", "etp.cli", *args], cwd=task_dir, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def measure_commands(task_dir: str, env: Dict[str, str], repeat: int) -> Dict[str, float]:
+    def remove_results():
+        os.remove(os.path.join(task_dir, ".etp", "cache", "cache.db"))
+
+    # the first runs compile the solutions, the timed ones then take them from the compile cache
+    etp(task_dir, env, "generate", "--skip-validation")
+    etp(task_dir, env, "run")
+    return {
+        "generate": measure(lambda: etp(task_dir, env, "generate", "--force", "--skip-validation"), repeat),
+        "generate (up to date)": measure(lambda: etp(task_dir, env, "generate", "--skip-validation"), repeat),
+        "run": measure(lambda: etp(task_dir, env, "run"), repeat, remove_results),
+        "run -c": measure(lambda: etp(task_dir, env, "run", "-c"), repeat),
+        "geninfo": measure(lambda: etp(task_dir, env, "geninfo"), repeat),
+    }
+
+
+def measure_phases(task_dir: str, env: Dict[str, str], solutions: List[str], repeat: int) -> Dict[str, float]:
+    # the end to end commands above have already generated the tests; the compile cache of the separate
+    # home is used here as well
+    os.chdir(task_dir)
+    compile_cache.COMPILE_CACHE_DIR = os.path.join(env["HOME"], ".etp", "cache", "compile")
+    set_verbose(False)
+    with open(os.path.join("gen", "GEN")) as f:
+        genfile = parse_genfile(f)
+    task_config = TaskConfig(time_limit=1, memory_limit=256, score_type="GroupSum")
+    tests = genfile.tests
+    results = {}
+
+    def hash_tests():
+        for test in tests:
+            hash_file(test.input_path)
+            hash_file(test.output_path)
+
+    results["hashing"] = measure(hash_tests, repeat)
+
+    with Cache() as cache:
+        results["hashing (memoized)"] = measure(lambda: [cache.get_io_hash(test) for test in tests], repeat)
+
+    context_hash = hash_string("benchmark context")
+    solution_hash = hash_string("benchmark solution")
+    io_hashes = {test.index: hash_string(str(test.index)) for test in tests}
+
+    def write_results():
+        with Cache() as cache:
+            for test in tests:
+                cache.put_test_result("benchmark.c", test.index, context_hash, solution_hash,
+                                      io_hashes[test.index], TestResult(1.0, 1, True, "", memory_kb=1024))
+
+    def read_results():
+        with Cache() as cache:
+            cache.get_test_results("benchmark.c", context_hash, solution_hash)
+
+    results["cache write"] = measure(write_results, repeat)
+    results["cache read"] = measure(read_results, repeat)
+
+    results["process startup"] = measure(lambda: [run_process(["true"]) for _ in tests], repeat)
+
+    solution = get_solution_descriptor(os.path.join("solution", "sol.c"))
+    workspaces = WorkspacePool(1)
+    with workspaces.acquire() as workspace:
+        executable_path = os.path.join(workspace.working_dir, "benchmark_sol")
+        compile_solution(solution, executable_path)
+        relative_path = os.path.relpath(executable_path, workspace.working_dir)
+        results["run solution"] = measure(
+            lambda: [run_solution(task_config, workspace.working_dir, solution, relative_path, test,
+                                  workspace.output_path, 10_000, memory_limit_mb=256) for test in tests], repeat)
+
+    checker = DiffChecker()
+    results["diff"] = measure(lambda: [checker.execute_checker(test, test.output_path) for test in tests], repeat)
+
+    solutions = [get_solution_descriptor(os.path.join("solution", name)) for name in solutions]
+    tracker = TestResultTracker()
+    for descriptor in solutions:
+        for test in tests:
+            tracker.register_test_result(descriptor, test, TestResult(1.0, 1, True, "", memory_kb=1024))
+    scorer = get_scorer(task_config, genfile)
+
+    def render():
+        tabulate(create_table(genfile, solutions, tracker), headers="firstrow", tablefmt="fancy_grid")
+        tabulate(create_subtask_table(tests, solutions, scorer, tracker, genfile),
+                 headers="firstrow", tablefmt="fancy_grid")
+
+    results["rendering"] = measure(render, repeat)
+    return results
+
+
+def get_version() -> str:
+    try:
+        etp_version = version("etp")
+    except PackageNotFoundError:
+        etp_version = "unknown"
+
+    # the version number alone doesn't change between commits
+    git = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True)
+    if git.returncode == 0:
+        etp_version += f"+{git.stdout.strip()}"
+    return etp_version
+
+
+def print_results(results: Dict[str, float], n_tests: int, previous: Dict = None):
+    table: List[List[str]] = [["", "Total", "Per test"]]
+    if previous is not None:
+        table[0] += [previous["version"], "Change"]
+
+    for name, seconds in results.items():
+        row = [name, f"{seconds * 1000:.1f} ms", f"{seconds * 1e6 / n_tests:.1f} us"]
+        if previous is not None:
+            old = previous["results"].get(name)
+            if old is None:
+                row += ["", ""]
+            else:
+                row += [f"{old * 1000:.1f} ms", f"{100 * (seconds - old) / old:+.1f}%"]
+        table.append(row)
+    print(tabulate(table, headers="firstrow", tablefmt="simple"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tests", type=int, default=200)
+    parser.add_argument("--checker", action="store_true", help="use a (C) checker instead of the built-in diff")
+    parser.add_argument("--batchmanager", action="store_true", help="run the solutions through a batchmanager")
+    parser.add_argument("--repeat", type=int, default=3, help="each measurement is the median of this many")
+    parser.add_argument("--save", metavar="FILE", help="defaults to benchmarks/results/<version>.json")
+    parser.add_argument("--compare", metavar="FILE", help="results saved by an earlier version")
+    args = parser.parse_args()
+
+    solutions = get_solutions()
+    parameters = {"tests": args.tests, "solutions": solutions, "checker": args.checker,
+                  "batchmanager": args.batchmanager}
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if previous["parameters"] != parameters:
+            print(f"WARN: {args.compare} was measured with different parameters: {previous['parameters']}")
+
+    etp_version = get_version()
+    save_path = args.save or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                          f"{etp_version}.json")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        task_dir = os.path.join(directory, "task")
+        make_task(task_dir, args.tests, solutions, args.checker, args.batchmanager)
+        env = make_home(directory)
+
+        results = measure_commands(task_dir, env, args.repeat)
+        results.update(measure_phases(task_dir, env, solutions, args.repeat))
+        os.chdir(cwd)
+
+    print(f"etp {etp_version}, {args.tests} tests, {', '.join(solutions)}"
+          f"{', checker' if args.checker else ''}{', batchmanager' if args.batchmanager else ''}")
+    print_results(results, args.tests, previous)
+
+    os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+    with open(save_path, "w") as f:
+        json.dump({"version": etp_version,
+                   "date": datetime.now().isoformat(timespec="seconds"),
+                   "python": platform.python_version(),
+                   "platform": platform.platform(),
+                   "parameters": parameters,
+                   "results": results}, f, indent=2)
+    print(f"Saved to {save_path}")
+
+
+if __name__ == "__main__":
+    main()
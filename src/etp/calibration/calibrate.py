@@ -0,0 +1,159 @@
+import math
+import os.path
+import subprocess
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from tabulate import tabulate
+
+from etp.common.compile import compile_solution, get_executable_path
+from etp.common.run import run_solution
+from etp.common.solution_descriptor import get_solution_descriptor, SolutionDescriptor
+from etp.common.test import Test
+from etp.common.workspace import WorkspacePool
+from etp.config.genfile import Genfile
+from etp.config.task_config import TaskConfig
+from etp.etp_exception import EtpException, UnsupportedLanguageException
+from etp.print_utils import yellow_bold, green_bold
+from etp.testing.cache.cache import Cache
+from etp.testing.cache.hashing import hash_file
+from etp.testing.verdict import FailedVerdict
+
+# the time limit is at least this many times the time of the slowest correct solution...
+CORRECT_MARGIN = 2.0
+# ...and should be at most the time of the fastest slow solution divided by this
+SLOW_MARGIN = 1.5
+# slow solutions are stopped after this long, their time is then only known to be at least this much
+CALIBRATE_TIMEOUT_MS = 10_000
+
+
+@dataclass
+class SolutionTiming:
+    solution: SolutionDescriptor
+    expected_slow: bool
+    max_time_ms: int = 0  # the slowest test
+    lower_bound: bool = False  # the solution was stopped, so max_time_ms is a lower bound
+    cached_tests: int = 0
+    run_tests: int = 0
+    failed_tests: List[int] = field(default_factory=list)  # crashed, so the time says nothing
+
+
+def calibrate(task_config: TaskConfig, genfile: Genfile, test_count: int):
+    correct = task_config.correct_solutions or []
+    slow = task_config.slow_solutions or []
+    if not correct:
+        raise EtpException("No correct_solutions in task.yaml, nothing to calibrate with")
+
+    tests = get_heaviest_tests(genfile, test_count)
+    print(f"Timing solutions on tests {', '.join(str(test.index) for test in tests)}")
+
+    timings = []
+    workspaces = WorkspacePool(1)
+    with Cache(hash_algorithm=task_config.hash_algorithm) as cache:
+        for path, expected_slow in [(path, False) for path in correct] + [(path, True) for path in slow]:
+            timing = time_solution(task_config, cache, workspaces, path, expected_slow, tests)
+            if timing is not None:
+                timings.append(timing)
+
+    print_timings(timings)
+    for interpreted in [False, True]:
+        key = "time_limit_interpreted" if interpreted else "time_limit"
+        same_kind = [timing for timing in timings if timing.solution.language.is_interpreted == interpreted]
+        suggest_time_limit(key, [timing for timing in same_kind if not timing.expected_slow],
+                           [timing for timing in same_kind if timing.expected_slow])
+
+
+def get_heaviest_tests(genfile: Genfile, test_count: int) -> List[Test]:
+    missing = [test.input_path for test in genfile.tests if not os.path.isfile(test.input_path)]
+    if missing:
+        raise EtpException(f"{len(missing)} input files are missing (e.g. {missing[0]}), run `etp generate` first")
+
+    # the largest inputs are usually the ones that decide the time limit
+    tests = sorted(genfile.tests, key=lambda test: os.path.getsize(test.input_path), reverse=True)
+    if test_count > 0:
+        tests = tests[:test_count]
+    return sorted(tests, key=lambda test: test.index)
+
+
+def time_solution(task_config: TaskConfig, cache: Cache, workspaces: WorkspacePool,
+                  path: str, expected_slow: bool, tests: List[Test]) -> Optional[SolutionTiming]:
+    try:
+        solution = get_solution_descriptor(path)
+    except UnsupportedLanguageException:
+        print(yellow_bold("WARN:"), f"unsupported language in solution {path}, skipping it")
+        return None
+
+    executable_path = get_executable_path(solution)
+    try:
+        compile_solution(solution, executable_path)
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
+        print(yellow_bold("WARN:"), f"{path} doesn't compile, skipping it")
+        return None
+
+    # times measured by earlier `etp run`s of the same binary are used as they are
+    known = cache.get_timings(solution.path, hash_file(executable_path))
+    timing = SolutionTiming(solution, expected_slow)
+    for test in tests:
+        cached = known.get(cache.get_io_hash(test).hexdigest())
+        if cached is not None and cached[0] != FailedVerdict.HardTimeLimitExceeded:
+            time_ms, lower_bound = cached[1], False
+            failed = cached[0] in [FailedVerdict.RuntimeError, FailedVerdict.MemoryLimitExceeded]
+            timing.cached_tests += 1
+        else:
+            with workspaces.acquire() as workspace:
+                result = run_solution(task_config, workspace.working_dir, solution,
+                                      os.path.relpath(executable_path, workspace.working_dir),
+                                      test, workspace.output_path, CALIBRATE_TIMEOUT_MS,
+                                      memory_limit_mb=task_config.memory_limit)
+            time_ms, lower_bound = result.elapsed_time_ms, result.timed_out
+            failed = not result.timed_out and result.returncode != 0
+            timing.run_tests += 1
+
+        if failed:
+            timing.failed_tests.append(test.index)
+        elif time_ms >= timing.max_time_ms:
+            timing.max_time_ms = time_ms
+            timing.lower_bound = lower_bound
+
+    return timing
+
+
+def print_timings(timings: List[SolutionTiming]):
+    table = [["Solution", "Expected", "Slowest test", "Cached / run", "Crashed on"]]
+    for timing in timings:
+        table.append([timing.solution.path,
+                      "slow" if timing.expected_slow else "correct",
+                      f"{'>=' if timing.lower_bound else ''}{timing.max_time_ms} ms",
+                      f"{timing.cached_tests} / {timing.run_tests}",
+                      ", ".join(map(str, timing.failed_tests))])
+    print(tabulate(table, headers="firstrow", tablefmt="fancy_grid"))
+
+
+def suggest_time_limit(key: str, correct: List[SolutionTiming], slow: List[SolutionTiming]):
+    if not correct:
+        return
+
+    for timing in correct:
+        if timing.lower_bound:
+            print(yellow_bold("WARN:"), f"{timing.solution.path} was stopped after {timing.max_time_ms} ms, "
+                                        f"its time (and so the suggested {key}) is only a lower bound")
+
+    slowest_correct_ms = max(timing.max_time_ms for timing in correct)
+    limit_ms = round_limit(CORRECT_MARGIN * slowest_correct_ms)
+
+    if slow:
+        fastest_slow_ms = min(timing.max_time_ms for timing in slow)
+        if limit_ms * SLOW_MARGIN > fastest_slow_ms:
+            # can't have both margins, the geometric mean keeps the ratios to both sides equal
+            limit_ms = round_limit(math.sqrt(slowest_correct_ms * fastest_slow_ms))
+            print(yellow_bold("WARN:"), f"for {key}, the slowest correct solution ({slowest_correct_ms} ms) and the "
+                                        f"fastest slow solution ({fastest_slow_ms} ms) are too close to separate "
+                                        f"them with the usual margins")
+            if limit_ms <= slowest_correct_ms or limit_ms >= fastest_slow_ms:
+                print(yellow_bold("WARN:"), "no time limit separates them, consider changing the tests")
+
+    print(green_bold(f"Suggested {key}:"), f"{limit_ms / 1000:g}")
+
+
+def round_limit(limit_ms: float) -> int:
+    return max(100, 100 * math.ceil(limit_ms / 100))  # rounded up to 0.1 s
@@ -5,6 +5,7 @@ from email.policy import default
 
 import yaml
 
+from etp.calibration.calibrate import calibrate
 from etp.common.geninfo import print_geninfo
 from etp.config.genfile import Genfile
 from etp.config.parse_genfile import parse_genfile
@@ -13,7 +14,8 @@ from etp.etp_exception import EtpException
 from etp.generation.delete_extra import delete_extra_files, delete_extra_input_output
 from etp.generation.generate_inputs import generate_inputs
 from etp.generation.generate_outputs import generate_outputs
-from etp.print_utils import red_bold, green_bold, yellow_bold
+from etp.print_utils import red_bold, green_bold, yellow_bold, set_verbose
+from etp.profiling import enable_profiling, report_profile, span
 from etp.skeleton.skeleton import generate_skeleton
 from etp.testing.test_solutions import test_solutions
 from etp.validation.run_validator import validate_all
@@ -52,6 +54,9 @@ def get_task_config() -> TaskConfig:
 
 
 def generate(args):
+    if args.jobs < 1:
+        raise EtpException("--jobs must be at least 1")
+
     move_to_root_dir()
     genfile = get_genfile()
     task_config = get_task_config()
@@ -59,13 +64,15 @@ def generate(args):
     if args.skip_input:
         print(yellow_bold("Skipping input generation."))
     else:
-        generate_inputs(genfile)
+        with span("input generation"):
+            generate_inputs(genfile, args.jobs, bool(args.force), task_config.hash_algorithm)
         print(green_bold("Input generation complete."))
 
     if args.skip_validation:
         print(yellow_bold("Skipping input validation."))
     else:
-        ok = validate_all(task_config, genfile)
+        with span("validation"):
+            ok = validate_all(task_config, genfile, args.jobs)
         if not ok:
             print(red_bold("FAILED:"), "there were errors during validation. Terminating.")
             return
@@ -74,7 +81,8 @@ def generate(args):
     if args.skip_output:
         print(yellow_bold("Skipping output generation."))
     else:
-        ok = generate_outputs(task_config, genfile, bool(args.no_timeout))
+        with span("output generation"):
+            ok = generate_outputs(task_config, genfile, bool(args.no_timeout), bool(args.force))
         if not ok:
             print(red_bold("FAILED:"), "there were errors during output generation. Terminating.")
             return
@@ -119,7 +127,28 @@ def run(args):
     else:
         solutions = task_config.solutions
 
-    test_solutions(task_config, genfile, solutions, args.use_cache)
+    if args.jobs < 1:
+        raise EtpException("--jobs must be at least 1")
+    if args.repeat < 1:
+        raise EtpException("--repeat must be at least 1")
+    if args.checker_jobs < 0:
+        raise EtpException("--checker-jobs can't be negative")
+
+    set_verbose(bool(args.verbose))
+    test_solutions(task_config, genfile, solutions, args.use_cache, args.jobs, bool(args.fast_fail), args.order,
+                   args.checker_jobs, args.repeat, args.output_json, args.output_csv, bool(args.verbose),
+                   not args.no_compile_cache)
+
+
+def calibrate_time_limits(args):
+    if args.tests < 0:
+        raise EtpException("--tests can't be negative")
+
+    move_to_root_dir()
+    genfile = get_genfile()
+    task_config = get_task_config()
+
+    calibrate(task_config, genfile, args.tests)
 
 
 def geninfo(_):
@@ -134,6 +163,16 @@ def init(_):
     generate_skeleton()
 
 
+def add_profiling_arguments(subparser: argparse.ArgumentParser):
+    subparser.add_argument("--profile", action="count", default=0,
+                           help="If present, the time spent in each phase (compiling, hashing, the cache, running "
+                                "solutions, the checker, ...) is printed at the end.")
+    subparser.add_argument("--trace-file", metavar="FILE",
+                           help="If present, the phases are written to FILE as a Chrome trace (JSON), with a span "
+                                "for every test of every solution. Open it in chrome://tracing or "
+                                "ui.perfetto.dev.")
+
+
 def main():
     parser = argparse.ArgumentParser(prog="etp")
     subparsers = parser.add_subparsers(required=True)
@@ -161,6 +200,13 @@ def main():
                                  help="If present, no timeout is applied on output file generation.")
     generate_parser.add_argument("--no-delete", action="count", default=0,
                                  help="If present, extra files in input/ and output/ directories are not deleted")
+    generate_parser.add_argument("--force", action="count", default=0,
+                                 help="If present, all inputs and outputs are generated, even the ones that are "
+                                      "up to date.")
+    generate_parser.add_argument("-j", "--jobs", type=int, default=1,
+                                 help="The number of GEN lines or validations to run at the same time. "
+                                      "Defaults to 1.")
+    add_profiling_arguments(generate_parser)
     generate_parser.set_defaults(func=generate)
 
     run_parser = subparsers.add_parser("run",
@@ -171,8 +217,45 @@ def main():
     run_parser.add_argument("-c", "--use-cache", action="count", default=0,
                             help="If present, then verdicts which 'should not have changed' "
                                  "are read from a cache.")
+    run_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="The number of tests to run at the same time. Defaults to 1.")
+    run_parser.add_argument("--fast-fail", action="count", default=0,
+                            help="If present, tests that can no longer change the score are skipped (shown as "
+                                 "SK). Only for GroupMin and GroupMul.")
+    run_parser.add_argument("--order", choices=["gen", "history"], default="gen",
+                            help="The order tests are run in. 'gen' (default) is the order in GEN, 'history' runs "
+                                 "the tests that failed most often in earlier runs first. The result tables "
+                                 "are the same either way.")
+    run_parser.add_argument("--checker-jobs", type=int, default=0,
+                            help="If positive, outputs are checked by this many separate threads, so that the next "
+                                 "test can run while the checker is working. Defaults to 0 (each test is checked "
+                                 "right after it runs).")
+    run_parser.add_argument("--repeat", type=int, default=1,
+                            help="Tests whose time is within 20%% of the time limit are run this many times, and the "
+                                 "median time decides the verdict. Defaults to 1.")
+    run_parser.add_argument("--output-json", metavar="FILE",
+                            help="If present, all results are also written to FILE as JSON Lines (one object per "
+                                 "line), as soon as they are known.")
+    run_parser.add_argument("--output-csv", metavar="FILE",
+                            help="If present, all results are also written to FILE as CSV, as soon as they are "
+                                 "known.")
+    run_parser.add_argument("-v", "--verbose", action="count", default=0,
+                            help="If present, every test is printed as it runs. Otherwise, the progress is shown "
+                                 "per solution and subtask (redrawn in place on a terminal).")
+    run_parser.add_argument("--no-compile-cache", action="count", default=0,
+                            help="If present, all solutions are compiled, even if a build of the same source is in "
+                                 "the compile cache (~/.etp/cache/compile/).")
+    add_profiling_arguments(run_parser)
     run_parser.set_defaults(func=run)
 
+    calibrate_parser = subparsers.add_parser("calibrate",
+                                             help="suggests time limits based on the times of the correct and slow "
+                                                  "solutions in task.yaml")
+    calibrate_parser.add_argument("--tests", type=int, default=5,
+                                  help="The number of tests (those with the largest inputs) to time the solutions "
+                                       "on. 0 means all tests. Defaults to 5.")
+    calibrate_parser.set_defaults(func=calibrate_time_limits)
+
     geninfo_parser = subparsers.add_parser("geninfo",
                                            help="prints an annotated table of GEN")
     geninfo_parser.set_defaults(func=geninfo)
@@ -186,10 +269,19 @@ def main():
         sys.exit(1)
     args = parser.parse_args()
 
+    profile = getattr(args, "profile", 0)
+    trace_file = getattr(args, "trace_file", None)
+    if profile or trace_file:
+        enable_profiling()
+    if trace_file:
+        trace_file = os.path.abspath(trace_file)  # the command moves to the task root directory
+
     try:
         args.func(args)
     except EtpException as ex:
         print(red_bold("FAILED:"), ex)
+    finally:
+        report_profile(bool(profile), trace_file)
 
 
 if __name__ == "__main__":
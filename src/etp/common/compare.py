@@ -0,0 +1,169 @@
+import math
+import mmap
+import os
+import re
+from typing import Optional, Iterator
+
+CHUNK_SIZE = 1 << 20
+
+
+def describe_difference(answer_path: str, output_path: str) -> Optional[str]:
+    """Returns None if the two files are byte-for-byte identical, otherwise a short description
+    of where they differ. Memory use is constant and comparison stops at the first difference."""
+    answer_size = os.path.getsize(answer_path)
+    output_size = os.path.getsize(output_path)
+    if answer_size != output_size:
+        # cheap, and avoids reading files that can't be identical anyway
+        return f"output has {output_size} bytes, answer has {answer_size} bytes"
+
+    offset = find_first_difference(answer_path, output_path, answer_size)
+    if offset is None:
+        return None
+    return f"output differs from answer at byte {offset}"
+
+
+def find_first_difference(path_a: str, path_b: str, size: int) -> Optional[int]:
+    # both files must be `size` bytes long
+    if size == 0:
+        return None  # empty files can't be mapped
+
+    with open(path_a, "rb") as stream_a, open(path_b, "rb") as stream_b, \
+            mmap.mmap(stream_a.fileno(), 0, access=mmap.ACCESS_READ) as map_a, \
+            mmap.mmap(stream_b.fileno(), 0, access=mmap.ACCESS_READ) as map_b:
+        for start in range(0, size, CHUNK_SIZE):
+            chunk_a = map_a[start:start + CHUNK_SIZE]
+            chunk_b = map_b[start:start + CHUNK_SIZE]
+            if chunk_a != chunk_b:
+                return start + _first_difference_in_chunk(chunk_a, chunk_b)
+
+    return None
+
+
+def _first_difference_in_chunk(chunk_a: bytes, chunk_b: bytes) -> int:
+    # binary search on slice equality, which runs in C unlike a loop over the bytes
+    lo, hi = 0, len(chunk_a)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if chunk_a[lo:mid] == chunk_b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+# what `diff --ignore-trailing-space` considers whitespace at the end of a line
+LINE_END_WHITESPACE = b" \t\r\v\f"
+_TOKEN = re.compile(rb"\S+")
+
+
+def lines_match(answer_path: str, output_path: str) -> bool:
+    """Same result as `diff -q --ignore-trailing-space --strip-trailing-cr`, without starting a process:
+    the files must have the same lines once whitespace at the end of each line is removed."""
+    size = os.path.getsize(answer_path)
+    if size == os.path.getsize(output_path) and find_first_difference(answer_path, output_path, size) is None:
+        return True  # identical files are by far the most common case and much cheaper to detect
+
+    return _chunks_equal(_normalized_lines(answer_path), _normalized_lines(output_path))
+
+
+def _normalized_lines(path: str) -> Iterator[bytes]:
+    # yields the file with trailing whitespace removed from each line and every line
+    # terminated with \n, which is exactly the part of the file that diff compares
+    pending = b""  # whitespace at the end of an unfinished line, dropped if a newline follows
+    ends_with_newline = True
+    with open(path, "rb") as stream:
+        while True:
+            data = stream.read(CHUNK_SIZE)
+            if not data:
+                break
+            ends_with_newline = data.endswith(b"\n")
+
+            data = pending + data
+            cut = data.rfind(b"\n") + 1
+            complete = b"\n".join(line.rstrip(LINE_END_WHITESPACE) for line in data[:cut].split(b"\n"))
+            unfinished = data[cut:]
+            kept = unfinished.rstrip(LINE_END_WHITESPACE)
+            pending = unfinished[len(kept):]
+            yield complete + kept
+
+    if not ends_with_newline:
+        yield b"\n"  # diff treats a missing newline at the end of the file like a present one
+
+
+def _chunks_equal(chunks_a: Iterator[bytes], chunks_b: Iterator[bytes]) -> bool:
+    buffer_a = b""
+    buffer_b = b""
+    while True:
+        if not buffer_a:
+            buffer_a = next(chunks_a, None)
+        if not buffer_b:
+            buffer_b = next(chunks_b, None)
+        if buffer_a is None or buffer_b is None:
+            # equal only if both ended; the other one may still yield empty chunks
+            rest_a = b"" if buffer_a is None else buffer_a + b"".join(chunks_a)
+            rest_b = b"" if buffer_b is None else buffer_b + b"".join(chunks_b)
+            return rest_a == rest_b
+
+        n = min(len(buffer_a), len(buffer_b))
+        if buffer_a[:n] != buffer_b[:n]:
+            return False
+        buffer_a = buffer_a[n:]
+        buffer_b = buffer_b[n:]
+
+
+def tokens_match(answer_path: str, output_path: str, tolerance: float) -> Optional[str]:
+    """Compares the files token by token (tokens are separated by any whitespace). Tokens that are
+    both numbers may differ by `tolerance`, either absolutely or relative to the answer.
+    Returns None if the files match, otherwise a description of the first mismatch."""
+    answer_tokens = _tokens(answer_path)
+    output_tokens = _tokens(output_path)
+    index = 0
+    while True:
+        expected = next(answer_tokens, None)
+        found = next(output_tokens, None)
+        if expected is None and found is None:
+            return None
+        if expected is None:
+            return f"output has more than {index} tokens"
+        if found is None:
+            return f"output has only {index} tokens"
+        if expected != found and not _numbers_close(expected, found, tolerance):
+            return f"token {index + 1} differs: expected {_shorten(expected)}, got {_shorten(found)}"
+        index += 1
+
+
+def _tokens(path: str) -> Iterator[bytes]:
+    pending = b""  # a token that may continue in the next chunk
+    with open(path, "rb") as stream:
+        while True:
+            data = stream.read(CHUNK_SIZE)
+            if not data:
+                break
+
+            data = pending + data
+            pending = b""
+            for match in _TOKEN.finditer(data):
+                if match.end() == len(data):
+                    pending = match.group()
+                else:
+                    yield match.group()
+
+    if pending:
+        yield pending
+
+
+def _numbers_close(expected: bytes, found: bytes, tolerance: float) -> bool:
+    try:
+        expected_value = float(expected)
+        found_value = float(found)
+    except ValueError:
+        return False
+
+    if math.isnan(expected_value) or math.isnan(found_value):
+        return False
+    return abs(expected_value - found_value) <= tolerance * max(1.0, abs(expected_value))
+
+
+def _shorten(token: bytes) -> str:
+    text = token.decode(errors="replace")
+    return text if len(text) <= 20 else text[:17] + "..."
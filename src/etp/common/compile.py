@@ -1,14 +1,60 @@
+import hashlib
+import os.path
+import signal
 import subprocess
 
+from etp.common.compile_cache import get_compile_key, fetch_compiled, store_compiled
+from etp.common.process import run_process
 from etp.common.replace_command_tokens import replace_command_tokens
 from etp.common.solution_descriptor import SolutionDescriptor
-from etp.print_utils import red_bold
+from etp.print_utils import red_bold, print_verbose
 
+COMPILE_CPU_LIMIT_S = 10
+COMPILE_WALL_TIMEOUT_S = 120
+
+
+def get_executable_path(solution: SolutionDescriptor) -> str:
+    # solutions with the same name (e.g. sol.cpp and sol.py) must not overwrite each other
+    path_digest = hashlib.sha256(bytes(solution.path, "utf8")).hexdigest()[:16]
+    return os.path.join(".etp", "bin", path_digest, solution.name)
+
+
+def compile_solution(solution: SolutionDescriptor, executable_path: str, use_cache: bool = True):
+    # without use_cache, the solution is always compiled, and the new build replaces the cached one
+    os.makedirs(os.path.dirname(executable_path), exist_ok=True)
+    try:
+        key = get_compile_key(solution.language.compile_command, solution.path)
+    except OSError:
+        key = None  # e.g. the source doesn't exist, the compiler reports that below
+    if use_cache and key is not None and fetch_compiled(key, executable_path):
+        print_verbose(f"Using cached build of {solution.path}")
+        return
 
-def compile_solution(solution: SolutionDescriptor, executable_path: str):
     compile_command = replace_command_tokens(solution.language.compile_command, solution.path, executable_path)
     try:
-        subprocess.run(compile_command, check=True, timeout=10)
-    except Exception as e:
+        # the limit is on CPU time, so that a busy machine (e.g. other compilations running
+        # at the same time) doesn't make a compilation fail; the wall clock limit is only a backstop
+        result = run_process(compile_command, capture_output=True,
+                             timeout=COMPILE_WALL_TIMEOUT_S, cpu_limit_s=COMPILE_CPU_LIMIT_S)
+    except OSError as e:
         print(red_bold("Compilation failed:"), e)
-        raise e
+        raise subprocess.CalledProcessError(-1, compile_command) from e
+
+    # printed at once, compiler output of solutions compiled in parallel must not be interleaved
+    messages = (result.stdout + result.stderr).decode(errors="replace")
+    if result.returncode == 0 and not result.timed_out:
+        print(messages, end="")
+    else:
+        if result.timed_out:
+            error = subprocess.TimeoutExpired(compile_command, COMPILE_WALL_TIMEOUT_S)
+        elif result.returncode == -signal.SIGXCPU or result.cpu_time_ms >= 950 * COMPILE_CPU_LIMIT_S:
+            # the compiler driver may exit normally after its child got SIGXCPU, and the
+            # accounted CPU time can be slightly below the limit
+            error = subprocess.TimeoutExpired(compile_command, COMPILE_CPU_LIMIT_S)
+        else:
+            error = subprocess.CalledProcessError(result.returncode, compile_command)
+        print(messages + red_bold("Compilation failed: ") + str(error))
+        raise error
+
+    if key is not None:
+        store_compiled(key, executable_path)
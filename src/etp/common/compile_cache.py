@@ -0,0 +1,130 @@
+import os
+import re
+import shutil
+import tempfile
+from typing import List
+
+from etp.common.replace_command_tokens import replace_command_tokens
+from etp.testing.cache.hashing import hash_file, hash_string
+
+# shared by all tasks, so that e.g. the same solution in a copy of the task isn't compiled again
+COMPILE_CACHE_DIR = os.path.expanduser(os.path.join("~", ".etp", "cache", "compile"))
+COMPILE_CACHE_LIMIT_BYTES = 1 << 30
+
+INCLUDE_PATTERN = re.compile(rb'^\s*#\s*include\s*([<"])([^>"]+)[>"]', re.MULTILINE)
+
+
+def get_compile_key(compile_command: List[str], source_path: str) -> str:
+    # %e is left as is: the same build may be requested for any executable path
+    command = replace_command_tokens(compile_command, source_path, "%e")
+    key = hash_string(repr(command))
+    key = hash_string(get_compiler_identity(command[0]), key)
+    # the command is hashed as text, so for the files it names, only their contents are added
+    sources = [source_path] + [path for path in get_command_files(command) if path != source_path]
+    for path in sources:
+        key = hash_file(path, key)
+    for header_path in get_local_headers(sources, get_include_dirs(command)):
+        key = hash_string(header_path, key)
+        key = hash_file(header_path, key)
+    return key.hexdigest()
+
+
+def get_command_files(command: List[str]) -> List[str]:
+    # other files compiled or linked with the solution, e.g. a grader.cpp from languages.json;
+    # like in etp.generation.input_manifest, every argument that is an existing file counts
+    files = []
+    for token in command[1:]:
+        if os.path.isfile(token) and token not in files:
+            files.append(token)
+    return files
+
+
+def get_include_dirs(command: List[str]) -> List[str]:
+    dirs = []
+    for i, token in enumerate(command):
+        if token == "-I" and i + 1 < len(command):
+            dirs.append(command[i + 1])
+        elif token.startswith("-I") and len(token) > 2:
+            dirs.append(token[2:])
+    return dirs
+
+
+def get_local_headers(source_paths: List[str], include_dirs: List[str]) -> List[str]:
+    # headers of the task (e.g. a grader header next to the solution), found the way the preprocessor
+    # would: "x.h" next to the including file first, then in the -I directories; <x.h> only in the -I
+    # directories, system headers are covered by the compiler identity
+    headers = []
+    pending = list(source_paths)
+    while pending:
+        path = pending.pop()
+        with open(path, "rb") as f:
+            text = f.read()
+        for match in INCLUDE_PATTERN.finditer(text):
+            name = match.group(2).decode(errors="replace")
+            candidates = [os.path.join(d, name) for d in include_dirs]
+            if match.group(1) == b'"':
+                candidates.insert(0, os.path.join(os.path.dirname(path), name))
+            for candidate in candidates:
+                if os.path.isfile(candidate):
+                    candidate = os.path.normpath(candidate)
+                    if candidate not in headers:
+                        headers.append(candidate)
+                        pending.append(candidate)
+                    break
+    return headers
+
+
+def get_compiler_identity(program: str) -> str:
+    # a changed compiler binary (e.g. after an upgrade) has a different size or modification time
+    path = shutil.which(program)
+    if path is None:
+        return program
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    return f"{path} {stat.st_size} {stat.st_mtime_ns}"
+
+
+def fetch_compiled(key: str, executable_path: str) -> bool:
+    cached_path = os.path.join(COMPILE_CACHE_DIR, key)
+    try:
+        shutil.copy2(cached_path, executable_path)
+    except FileNotFoundError:
+        return False
+
+    os.utime(cached_path)  # eviction removes the least recently used entries first
+    return True
+
+
+def store_compiled(key: str, executable_path: str):
+    if not os.path.isfile(executable_path):
+        return  # the compile command didn't produce %e, nothing to reuse
+
+    os.makedirs(COMPILE_CACHE_DIR, exist_ok=True)
+    # another etp process may be storing the same entry, so it is written under a temporary name
+    # and renamed, which is atomic
+    fd, temp_path = tempfile.mkstemp(dir=COMPILE_CACHE_DIR, prefix=".tmp")
+    os.close(fd)
+    shutil.copy2(executable_path, temp_path)
+    os.replace(temp_path, os.path.join(COMPILE_CACHE_DIR, key))
+
+    evict_compiled(COMPILE_CACHE_LIMIT_BYTES)
+
+
+def evict_compiled(limit_bytes: int):
+    entries = []
+    for entry in os.scandir(COMPILE_CACHE_DIR):
+        if entry.name.startswith(".tmp"):
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= limit_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # already removed by another process
+        total_size -= size
+
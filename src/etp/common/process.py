@@ -0,0 +1,157 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+LIMITS_SHELL = "/bin/sh"
+
+# once the process group is killed, the pipes are closed and only the data already in them is left to read;
+# a descendant that left the group (setsid) may keep them open, its output is then not waited for
+PIPE_DRAIN_TIMEOUT_S = 5
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    cpu_time_ms: int  # user + system time of the process and its reaped descendants
+    peak_memory_kb: int  # peak resident set size, see run_process
+    timed_out: bool
+    stdout: Optional[bytes] = None
+    stderr: Optional[bytes] = None
+
+
+def run_process(command: List[str], cwd: str = None, stdin=None, stdout=None,
+                capture_output: bool = False, stderr_limit: int = None, timeout: float = None,
+                memory_limit_kb: int = None, cpu_limit_s: int = None) -> ProcessResult:
+    """Runs a command and reaps it with os.wait4, so that the resource usage of exactly
+    this process is measured. Unlike RUSAGE_CHILDREN deltas, this is correct when several
+    processes run at the same time and when the process has to be killed.
+
+    stdin and stdout may be files (or None to inherit them). If capture_output is set, stdout
+    and stderr are collected in memory instead. If stderr_limit is set, stderr is collected
+    but only its first stderr_limit bytes are kept.
+
+    memory_limit_kb is set as RLIMIT_AS and cpu_limit_s as RLIMIT_CPU, which every descendant of the
+    process inherits separately. The process runs in a new session, and its whole process group is
+    killed when it exits or times out, so that e.g. the child of a batchmanager or of a checker wrapper
+    script can't keep running (and keep the pipes open) after it.
+
+    The peak RSS reported by wait4 is at least that of etp itself: the process is started by vfork (or fork)
+    and the kernel carries the peak of the old memory over at exec. It is used only when it is higher than
+    etp's; otherwise the process was small, and VmHWM sampled while it ran (Linux only) is reported instead,
+    which may miss memory allocated just before the process exited."""
+    if memory_limit_kb is not None or cpu_limit_s is not None:
+        command = _with_limits(command, memory_limit_kb, cpu_limit_s)
+
+    capture_stderr = capture_output or stderr_limit is not None
+    proc = subprocess.Popen(command,
+                            cwd=cwd,
+                            stdin=stdin,
+                            stdout=subprocess.PIPE if capture_output else stdout,
+                            stderr=subprocess.PIPE if capture_stderr else None,
+                            start_new_session=True)
+    parent_peak_kb = _read_peak_rss_kb("self")  # read after the exec, so it is at least the inherited peak
+
+    # pipes are serviced by threads (as in Popen.communicate), the main thread waits for the process
+    threads = []
+    stdout_chunks = []
+    stderr_chunks = []
+    if capture_output:
+        threads.append(threading.Thread(target=_read_all, args=(proc.stdout, stdout_chunks)))
+    if capture_stderr:
+        limit = None if capture_output else stderr_limit
+        threads.append(threading.Thread(target=_read_all, args=(proc.stderr, stderr_chunks, limit)))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    status, rusage, timed_out, sampled_peak_kb = _wait(proc, timeout)
+    proc.returncode = os.waitstatus_to_exitcode(status)  # also tells Popen not to wait for it again
+
+    for thread in threads:
+        thread.join(PIPE_DRAIN_TIMEOUT_S)
+
+    peak_memory_kb = rusage.ru_maxrss
+    if sys.platform == "darwin":
+        peak_memory_kb //= 1024  # bytes on macOS
+    if parent_peak_kb is not None and peak_memory_kb <= parent_peak_kb:
+        peak_memory_kb = sampled_peak_kb
+
+    return ProcessResult(proc.returncode,
+                         int(1000 * (rusage.ru_utime + rusage.ru_stime)),
+                         peak_memory_kb,
+                         timed_out,
+                         b"".join(stdout_chunks) if capture_output else None,
+                         b"".join(stderr_chunks) if capture_stderr else None)
+
+
+def _with_limits(command: List[str], memory_limit_kb: Optional[int], cpu_limit_s: Optional[int]) -> List[str]:
+    # the limits are set by a shell that then execs the command (same pid, so wait4 still measures it).
+    # A preexec_fn would run Python code in the forked child, which isn't safe while other threads
+    # run (etp run -j), and it rules out vfork, so every test would copy the page tables of etp
+    script = []
+    if memory_limit_kb is not None:
+        script.append(f"ulimit -v {memory_limit_kb}")
+    if cpu_limit_s is not None:
+        # SIGXCPU at the soft limit, SIGKILL a second later if it is ignored;
+        # the soft limit is set first, the hard limit can't go below it
+        script += [f"ulimit -S -t {cpu_limit_s}", f"ulimit -H -t {cpu_limit_s + 1}"]
+    script.append('exec "$@"')
+    return [LIMITS_SHELL, "-c", " && ".join(script), "sh"] + command
+
+
+def _wait(proc: subprocess.Popen, timeout: Optional[float]):
+    # same polling scheme as Popen.wait; only this thread reaps the process, and waitid with WNOWAIT
+    # leaves it unreaped, so its pid (and the id of its process group) can't be reused until wait4 below.
+    # VmHWM is sampled on every poll, it is gone once the process has exited
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    peak_kb = 0
+    timed_out = False
+    while os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+        peak_kb = max(peak_kb, _read_peak_rss_kb(proc.pid) or 0)
+
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            timed_out = True
+            break
+
+        time.sleep(delay if remaining is None else min(delay, remaining))
+        delay = min(2 * delay, 0.05)
+
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    _, status, rusage = os.wait4(proc.pid, 0)
+    return status, rusage, timed_out, peak_kb
+
+
+def _read_peak_rss_kb(pid) -> Optional[int]:
+    # peak RSS since the last exec, None if /proc isn't available or the process has exited
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _read_all(stream, chunks: List[bytes], limit: int = None):
+    # past the limit, the data is still read (so that the process doesn't block) but dropped
+    kept = 0
+    with stream:
+        while True:
+            data = stream.read(1 << 16)
+            if not data:
+                break
+            if limit is not None:
+                data = data[:max(0, limit - kept)]
+            kept += len(data)
+            chunks.append(data)
@@ -1,58 +1,101 @@
+import math
 import os.path
-import resource
 import shutil
 import subprocess
+from contextlib import ExitStack
 from dataclasses import dataclass
 
+from etp.common.process import run_process
 from etp.common.replace_command_tokens import replace_command_tokens
 from etp.common.solution_descriptor import SolutionDescriptor
 from etp.common.test import Test
 from etp.config.task_config import TaskConfig
+from etp.print_utils import print_verbose
+from etp.profiling import span
+
+# with RLIMIT_AS, a failed allocation doesn't kill the process, the runtime reports it instead
+OUT_OF_MEMORY_MARKERS = [b"std::bad_alloc", b"MemoryError", b"Out of memory", b"out of memory"]
+
+# the hard limit (timeout_ms) is on CPU time, so that a solution waiting for the CPU (e.g. with etp run -j)
+# isn't killed early; the wall clock limit, this many times longer, is only a backstop, e.g. for a solution
+# that sleeps or waits for input
+WALL_TIMEOUT_FACTOR = 10
+
+# only the beginning of stderr is kept, a solution may write debug output of any size there
+STDERR_LIMIT_BYTES = 64 * 1024
 
 
 @dataclass
 class RunResult:
     returncode: int
     elapsed_time_ms: int
-    output: bytes
+    output_path: str = None  # file containing the output of the solution, None if it didn't finish
+    memory_kb: int = None
+    timed_out: bool = False
+    memory_limit_exceeded: bool = False
+    stderr: bytes = b""
 
 
 def run_solution(task_config: TaskConfig, cwd: str,
                  solution: SolutionDescriptor, executable_path: str,  # relative to cwd
-                 test: Test, timeout_ms: int = None,
-                 batchmanager_path=None) -> RunResult:
-    if task_config.infile:
-        shutil.copyfile(test.input_path, os.path.join(cwd, task_config.infile))
-        in_bytes = None
-    else:
-        with open(test.input_path, "rb") as in_stream:
-            in_bytes = in_stream.read()
-
-    execute_command = replace_command_tokens(solution.language.execute_command,
-                                             solution.path, executable_path)
-    if batchmanager_path is not None:
-        execute_command = [batchmanager_path, task_config.infile, task_config.outfile] + execute_command
-
-    usage_start = resource.getrusage(resource.RUSAGE_CHILDREN)
-    try:
-        print(f"Running {execute_command} on {test.input_path}...")
-        exec_result = subprocess.run(execute_command,
-                                     capture_output=True,
-                                     input=in_bytes,
-                                     cwd=cwd,
-                                     timeout=None if timeout_ms is None else timeout_ms / 1000)
-    except subprocess.TimeoutExpired:
-        print("Hard timeout exceeded.")
-        return RunResult(-1, timeout_ms, b"")
-
-    usage_end = resource.getrusage(resource.RUSAGE_CHILDREN)
-    elapsed_time_ms = int(1000 * (usage_end.ru_utime + usage_end.ru_stime - usage_start.ru_utime - usage_start.ru_stime))
-
-    if task_config.outfile:
-        with open(os.path.join(cwd, task_config.outfile), "rb") as out_stream:
-            out_bytes = out_stream.read()
-    else:
-        out_bytes = exec_result.stdout
-
-    print(f"Return code: {exec_result.returncode}, elapsed time: {elapsed_time_ms}")
-    return RunResult(exec_result.returncode, elapsed_time_ms, out_bytes)
\ No newline at end of file
+                 test: Test, output_path: str, timeout_ms: int = None,  # CPU time
+                 batchmanager_path=None, memory_limit_mb: int = None) -> RunResult:
+    # the input file is given to the solution as is and its stdout goes straight to output_path,
+    # neither is ever read into memory here
+    with ExitStack() as stack:
+        if task_config.infile:
+            shutil.copyfile(test.input_path, os.path.join(cwd, task_config.infile))
+            stdin = None
+        else:
+            stdin = stack.enter_context(open(test.input_path, "rb"))
+
+        if task_config.outfile:
+            result_path = os.path.join(cwd, task_config.outfile)
+            if os.path.exists(result_path):
+                os.remove(result_path)  # left over from the previous run in the same directory
+            stdout = subprocess.DEVNULL
+        else:
+            result_path = output_path
+            stdout = stack.enter_context(open(output_path, "wb"))
+
+        execute_command = replace_command_tokens(solution.language.execute_command,
+                                                 solution.path, executable_path)
+        if batchmanager_path is not None:
+            execute_command = [batchmanager_path, task_config.infile, task_config.outfile] + execute_command
+
+        print_verbose(f"Running {execute_command} on {test.input_path}...")
+        with span("solution execution", solution=solution.path, test=test.index):
+            exec_result = run_process(execute_command,
+                                      cwd=cwd,
+                                      stdin=stdin,
+                                      stdout=stdout,
+                                      stderr_limit=STDERR_LIMIT_BYTES,
+                                      timeout=None if timeout_ms is None else WALL_TIMEOUT_FACTOR * timeout_ms / 1000,
+                                      cpu_limit_s=None if timeout_ms is None else math.ceil(timeout_ms / 1000),
+                                      memory_limit_kb=None if memory_limit_mb is None else 1024 * memory_limit_mb)
+
+    # RLIMIT_CPU has a granularity of seconds, and SIGKILL comes a second after SIGXCPU if that is ignored;
+    # the accounted CPU time can be slightly below the limit. The signal isn't checked: a batchmanager
+    # that doesn't exec the solution exits with its own code after the solution was killed
+    cpu_limit_exceeded = timeout_ms is not None and exec_result.returncode != 0 and \
+        exec_result.cpu_time_ms >= 950 * math.ceil(timeout_ms / 1000)
+    if exec_result.timed_out or cpu_limit_exceeded:
+        print_verbose("Hard timeout exceeded.")
+        return RunResult(-1, exec_result.cpu_time_ms, None, exec_result.peak_memory_kb, True,
+                         stderr=exec_result.stderr)
+
+    # the peak RSS isn't compared with the limit: the address space, which is what is limited, is always
+    # larger, so only a solution that reports the failed allocation gets ML
+    if memory_limit_mb is not None and exec_result.returncode != 0:
+        if any(marker in exec_result.stderr for marker in OUT_OF_MEMORY_MARKERS):
+            print_verbose("Memory limit exceeded.")
+            return RunResult(exec_result.returncode, exec_result.cpu_time_ms, None, exec_result.peak_memory_kb,
+                             memory_limit_exceeded=True, stderr=exec_result.stderr)
+
+    if not os.path.exists(result_path):
+        open(result_path, "wb").close()  # the solution didn't create outfile, so its output is empty
+
+    print_verbose(f"Return code: {exec_result.returncode}, elapsed time: {exec_result.cpu_time_ms}, "
+                  f"memory: {exec_result.peak_memory_kb} KB")
+    return RunResult(exec_result.returncode, exec_result.cpu_time_ms, result_path, exec_result.peak_memory_kb,
+                     stderr=exec_result.stderr)
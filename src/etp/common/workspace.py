@@ -0,0 +1,35 @@
+import os.path
+import queue
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+
+@dataclass
+class Workspace:
+    working_dir: str  # cwd of the solution, also receives infile/outfile
+    output_path: str  # where the output of the solution is stored for checking
+
+
+class WorkspacePool:
+    """A fixed set of private working directories, so that concurrently running
+    solutions don't overwrite each other's files. A workspace is used by at most
+    one run at a time."""
+
+    def __init__(self, size: int):
+        Path(".etp", "output").mkdir(parents=True, exist_ok=True)
+
+        self.free = queue.Queue()
+        for i in range(size):
+            working_dir = os.path.join(".etp", "working", str(i))
+            Path(working_dir).mkdir(parents=True, exist_ok=True)
+            self.free.put(Workspace(working_dir, os.path.join(".etp", "output", f"out{i}")))
+
+    @contextmanager
+    def acquire(self) -> Iterator[Workspace]:
+        workspace = self.free.get()
+        try:
+            yield workspace
+        finally:
+            self.free.put(workspace)
@@ -1,9 +1,13 @@
+import re
 from typing import TextIO, List, Dict
 
 from etp.config.genfile import Genfile, GenTestGroup
 from etp.common.test import Test
 from etp.print_utils import yellow_bold
 
+# matches the input and output file names given to tests below, e.g. in expanded GEN lines
+TEST_FILE_PATTERN = re.compile(r"(?<![\w/])(?:input/input|output/output)(\d+)\.txt")
+
 
 def parse_known_parameters(params: List[str]) -> Dict:
     parsed = {}
@@ -20,6 +20,12 @@ class TaskConfig:
     validator: str = None
     model_solution: str = None
     solutions: List[str] = None
+    correct_solutions: List[str] = None  # expected to get full score, used by `etp calibrate`
+    slow_solutions: List[str] = None  # expected to exceed the time limit, used by `etp calibrate`
+    float_tolerance: float = None
+    hash_algorithm: str = "sha256"
+    checker_time_limit: float = 10
+    checker_memory_limit: int = None
 
     def __init__(self, **kwargs):
         if kwargs is not None:
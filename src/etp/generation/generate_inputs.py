@@ -1,29 +1,183 @@
+import os
+import signal
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
+from typing import Dict, Set, Tuple, Callable
 
+from etp.common.test import Test
 from etp.config.genfile import Genfile
 from etp.config.make_all import make_all_gen
+from etp.config.parse_genfile import TEST_FILE_PATTERN
 from etp.etp_exception import EtpException
+from etp.generation.input_manifest import get_input_fingerprint, is_input_up_to_date, record_generated_input
+from etp.print_utils import red_bold
+from etp.profiling import span
+from etp.testing.cache.cache import Cache
 
 
-def generate_inputs(genfile: Genfile):
+def expand_command(test: Test) -> str:
+    cmd = test.command_template
+    cmd = cmd.replace("%i", test.input_path)
+    cmd = cmd.replace("%o", test.output_path)
+    return cmd
+
+
+def generate_inputs(genfile: Genfile, jobs: int = 1, force: bool = False, hash_algorithm: str = "sha256"):
     make_all_gen()
 
     Path("input/").mkdir(parents=True, exist_ok=True)
     Path("output/").mkdir(parents=True, exist_ok=True)
 
     print("Generating inputs...")
+    commands: Dict[int, str] = {}
     for test in genfile.tests:
-        cmd = test.command_template
-        cmd = cmd.replace("%i", test.input_path)
-        cmd = cmd.replace("%o", test.output_path)
-
         if test.command_template.isdigit():
             print(f"Command template for {test.input_path} is just a digit, skipping...")
             continue
+        commands[test.index] = expand_command(test)
+
+    tests = {test.index: test for test in genfile.tests}
+    deps = find_dependencies(commands)
+
+    with Cache(hash_algorithm=hash_algorithm) as cache:
+        # fingerprints are taken before anything runs, so that they describe the generators that were used
+        with span("hashing"):
+            fingerprints = {index: get_input_fingerprint(cache, cmd) for index, cmd in commands.items()}
+
+        stale = set(commands.keys())
+        if not force:
+            with span("cache lookup"):
+                stale = {index for index in commands
+                         if not is_input_up_to_date(cache, tests[index], commands[index], fingerprints[index])}
+            stale = add_dependent_lines(stale, deps)
+            if len(stale) < len(commands):
+                print(f"{len(commands) - len(stale)} of {len(commands)} inputs are up to date, skipping them...")
+
+        def on_success(index: int):
+            record_generated_input(cache, tests[index], commands[index], fingerprints[index])
+
+        stale_commands = {index: cmd for index, cmd in commands.items() if index in stale}
+        if jobs == 1:
+            for index, cmd in stale_commands.items():
+                print(cmd)
+                try:
+                    with span("generator", test=index):
+                        subprocess.run([cmd], shell=True, check=True)
+                except subprocess.CalledProcessError:
+                    raise EtpException("generator raised error, terminating...")
+                on_success(index)
+        else:
+            generate_inputs_parallel(stale_commands, find_dependencies(stale_commands), jobs, on_success)
+
+
+def add_dependent_lines(stale: Set[int], deps: Dict[int, Set[int]]) -> Set[int]:
+    # a line that reads the files of a regenerated line must be regenerated as well
+    stale = set(stale)
+    changed = True
+    while changed:
+        changed = False
+        for index, index_deps in deps.items():
+            if index not in stale and not index_deps.isdisjoint(stale):
+                stale.add(index)
+                changed = True
+    return stale
+
+
+def find_dependencies(commands: Dict[int, str]) -> Dict[int, Set[int]]:
+    # a line depends on every other line whose input or output file it mentions,
+    # e.g. `bin/mutate < input/input3.txt > %i` must wait for line 3
+    deps = {}
+    for index, cmd in commands.items():
+        deps[index] = set()
+        for match in TEST_FILE_PATTERN.finditer(cmd):
+            other = int(match.group(1))
+            if other != index and other in commands:
+                deps[index].add(other)
+    return deps
+
+
+def generate_inputs_parallel(commands: Dict[int, str], deps: Dict[int, Set[int]], jobs: int,
+                             on_success: Callable[[int], None]):
+    waiting = list(commands.keys())
+    finished: Dict[int, Tuple[int, bytes]] = {}
+    next_to_print = 0  # position in `order` of the next line whose log is printed
+    order = list(commands.keys())
+
+    processes: Dict[int, subprocess.Popen] = {}
+    lock = threading.Lock()
+    stopping = threading.Event()
+    failed_index = None
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        while waiting or running:
+            if not stopping.is_set():
+                for index in list(waiting):
+                    if len(running) >= jobs:
+                        break
+                    if deps[index].issubset(finished.keys()):
+                        waiting.remove(index)
+                        future = executor.submit(run_generator_line, index, commands[index],
+                                                 processes, lock, stopping)
+                        running[future] = index
+
+            if not running:
+                if waiting and not stopping.is_set():
+                    raise EtpException(f"circular dependency between GEN lines {sorted(waiting)}")
+                break
+
+            done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                returncode, log = future.result()
+                finished[index] = (returncode, log)
+                if returncode == 0:
+                    on_success(index)
+                elif not stopping.is_set():
+                    failed_index = index
+                    stop_generator_lines(processes, lock, stopping)
+
+            # logs are printed in test order, as soon as all previous lines are done
+            while next_to_print < len(order) and order[next_to_print] in finished:
+                index = order[next_to_print]
+                returncode, log = finished[index]
+                if returncode != 0:
+                    break  # either the failure, which is reported below, or killed because of it
+                print(commands[index])
+                print(log.decode(errors="replace"), end="")
+                next_to_print += 1
+
+    if failed_index is not None:
+        print(red_bold("FAILED:"), commands[failed_index])
+        print(finished[failed_index][1].decode(errors="replace"), end="")
+        raise EtpException("generator raised error, terminating...")
+
+
+def run_generator_line(index: int, cmd: str, processes: Dict[int, subprocess.Popen],
+                       lock: threading.Lock, stopping: threading.Event) -> Tuple[int, bytes]:
+    with lock:
+        if stopping.is_set():
+            return -signal.SIGTERM, b""
+        # own session, so that the shell and everything it started can be killed together
+        proc = subprocess.Popen([cmd], shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                start_new_session=True)
+        processes[index] = proc
+
+    with span("generator", test=index):
+        log, _ = proc.communicate()
+
+    with lock:
+        del processes[index]
+    return proc.returncode, log
+
 
-        print(cmd)
-        try:
-            subprocess.run([cmd], shell=True, check=True)
-        except subprocess.CalledProcessError:
-            raise EtpException("generator raised error, terminating...")
+def stop_generator_lines(processes: Dict[int, subprocess.Popen], lock: threading.Lock, stopping: threading.Event):
+    with lock:
+        stopping.set()
+        for proc in processes.values():
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
@@ -1,4 +1,5 @@
 import os.path
+import shutil
 from pathlib import Path
 
 from etp.common.compile import compile_solution
@@ -6,13 +7,18 @@ from etp.common.run import run_solution
 from etp.common.solution_descriptor import get_solution_descriptor
 from etp.config.genfile import Genfile
 from etp.config.task_config import TaskConfig
+from etp.generation.output_manifest import is_output_up_to_date, record_generated_output
 from etp.print_utils import yellow_bold, red_bold
+from etp.profiling import span
+from etp.testing.cache.cache import Cache
+from etp.testing.cache.hashing import hash_file, hash_string
 
 
-def generate_outputs(task_config: TaskConfig, genfile: Genfile, no_timeout: bool) -> bool:
+def generate_outputs(task_config: TaskConfig, genfile: Genfile, no_timeout: bool, force: bool = False) -> bool:
     Path("input/").mkdir(parents=True, exist_ok=True)
     Path("output/").mkdir(parents=True, exist_ok=True)
     Path(".etp/working").mkdir(parents=True, exist_ok=True)
+    Path(".etp/output").mkdir(parents=True, exist_ok=True)
 
     if task_config.dummy_outputs:
         print("Generating dummy outputs as dummy_outputs was set to true in task.yaml")
@@ -25,27 +31,45 @@ def generate_outputs(task_config: TaskConfig, genfile: Genfile, no_timeout: bool
         return True
 
     descriptor = get_solution_descriptor(task_config.model_solution)
-    compile_solution(descriptor, os.path.join(".etp", "working", descriptor.name))
-
-    all_ok = True
-    for test in genfile.tests:
-        cmd = test.command_template
-        if "%o" in cmd:
-            print(f"Skipping generation of {test.output_path} as there is an '%o' token in the script line")
-            continue
-
-        print(f"Generating {test.output_path}...")
-        result = run_solution(task_config, os.path.join(".etp", "working"), descriptor,
-                              descriptor.name, test, None if no_timeout else 10_000)
-
-        if result.returncode != 0:
-            print(red_bold("FAILED:"), f"model solution got timeout or a runtime error "
-                                       f"on test {test.input_path} (return code: {result.returncode}, "
-                                       f"elapsed time: {result.elapsed_time_ms})")
-            all_ok = False
-            continue
-
-        with open(test.output_path, "wb") as out_file:
-            out_file.write(result.output)
+    executable_path = os.path.join(".etp", "working", descriptor.name)
+    with span("compile", solution=descriptor.path):
+        compile_solution(descriptor, executable_path, use_cache=not force)
+
+    # outputs are reused as long as the model solution binary, the way it's run and the input are the same
+    model_hash = hash_string(f"infile: {task_config.infile}, outfile: {task_config.outfile}")
+    model_hash = hash_file(executable_path, model_hash).hexdigest()
+
+    with Cache(hash_algorithm=task_config.hash_algorithm) as cache:
+        all_ok = True
+        up_to_date_count = 0
+        for test in genfile.tests:
+            cmd = test.command_template
+            if "%o" in cmd:
+                print(f"Skipping generation of {test.output_path} as there is an '%o' token in the script line")
+                continue
+
+            with span("hashing", test=test.index):
+                input_hash = cache.file_digest(test.input_path)
+            if not force and is_output_up_to_date(cache, model_hash, input_hash, test.output_path):
+                up_to_date_count += 1
+                continue
+
+            print(f"Generating {test.output_path}...")
+            result = run_solution(task_config, os.path.join(".etp", "working"), descriptor,
+                                  descriptor.name, test, os.path.join(".etp", "output", "model_out"),
+                                  None if no_timeout else 10_000)
+
+            if result.returncode != 0:
+                print(red_bold("FAILED:"), f"model solution got timeout or a runtime error "
+                                           f"on test {test.input_path} (return code: {result.returncode}, "
+                                           f"elapsed time: {result.elapsed_time_ms})")
+                all_ok = False
+                continue
+
+            shutil.move(result.output_path, test.output_path)
+            record_generated_output(cache, model_hash, input_hash, test.output_path)
+
+        if up_to_date_count > 0:
+            print(f"{up_to_date_count} outputs were up to date and were not generated again.")
 
     return all_ok
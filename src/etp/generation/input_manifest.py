@@ -0,0 +1,78 @@
+import os.path
+import shlex
+from dataclasses import dataclass
+from typing import List, Optional
+
+from etp.common.test import Test
+from etp.config.parse_genfile import TEST_FILE_PATTERN
+from etp.testing.cache.cache import Cache
+from etp.testing.cache.hashing import hash_string
+
+
+@dataclass
+class InputFingerprint:
+    # everything that determines the generated files, taken before the line is run
+    command_hash: str
+    generators_hash: str
+
+
+def get_command_files(cmd: str) -> List[str]:
+    # generators, scripts and data files that the line refers to, relative to the task root;
+    # files of other tests are dependencies and are handled by the scheduler instead
+    try:
+        lexer = shlex.shlex(cmd, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        tokens = cmd.split()
+
+    files = []
+    for token in tokens:
+        if TEST_FILE_PATTERN.fullmatch(token):
+            continue
+        if os.path.isfile(token) and token not in files:
+            files.append(token)
+    return files
+
+
+def get_input_fingerprint(cache: Cache, cmd: str) -> InputFingerprint:
+    # file digests are remembered by the cache, so unchanged generators aren't read again for every line
+    generators_hash = hash_string("")
+    for path in get_command_files(cmd):
+        generators_hash = hash_string(path, generators_hash)
+        generators_hash = hash_string(cache.file_digest(path), generators_hash)
+
+    return InputFingerprint(hash_string(cmd).hexdigest(), generators_hash.hexdigest())
+
+
+def hash_generated_files(cache: Cache, test: Test, cmd: str) -> Optional[str]:
+    # lines that write %o produce the output file as well
+    try:
+        files_hash = hash_string(cache.file_digest(test.input_path))
+        if test.output_path in cmd:
+            files_hash = hash_string(cache.file_digest(test.output_path), files_hash)
+    except FileNotFoundError:
+        return None
+
+    return files_hash.hexdigest()
+
+
+def is_input_up_to_date(cache: Cache, test: Test, cmd: str, fingerprint: InputFingerprint) -> bool:
+    row = cache.query_one("SELECT command_hash, generators_hash, files_hash FROM generated_inputs "
+                          "WHERE test_index = ?", (test.index,))
+    if row is None:
+        return False
+
+    command_hash, generators_hash, files_hash = row
+    return command_hash == fingerprint.command_hash and \
+        generators_hash == fingerprint.generators_hash and \
+        files_hash == hash_generated_files(cache, test, cmd)  # the files may have been edited or deleted since
+
+
+def record_generated_input(cache: Cache, test: Test, cmd: str, fingerprint: InputFingerprint):
+    files_hash = hash_generated_files(cache, test, cmd)
+    if files_hash is None:
+        return  # the line didn't produce its input, so it should run again next time
+
+    cache.write("INSERT OR REPLACE INTO generated_inputs VALUES(?, ?, ?, ?)",
+                (test.index, fingerprint.command_hash, fingerprint.generators_hash, files_hash))
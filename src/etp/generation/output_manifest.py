@@ -0,0 +1,25 @@
+from typing import Optional
+
+from etp.testing.cache.cache import Cache
+
+
+def get_recorded_output_hash(cache: Cache, model_hash: str, input_hash: str) -> Optional[str]:
+    row = cache.query_one("SELECT output_hash FROM generated_outputs WHERE model_hash = ? AND input_hash = ?",
+                          (model_hash, input_hash))
+    return None if row is None else row[0]
+
+
+def is_output_up_to_date(cache: Cache, model_hash: str, input_hash: str, output_path: str) -> bool:
+    output_hash = get_recorded_output_hash(cache, model_hash, input_hash)
+    if output_hash is None:
+        return False
+
+    try:
+        return cache.file_digest(output_path) == output_hash
+    except FileNotFoundError:
+        return False
+
+
+def record_generated_output(cache: Cache, model_hash: str, input_hash: str, output_path: str):
+    cache.write("INSERT OR REPLACE INTO generated_outputs VALUES(?, ?, ?)",
+                (model_hash, input_hash, cache.file_digest(output_path)))
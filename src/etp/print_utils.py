@@ -7,4 +7,17 @@ def green_bold(s: str) -> str:
 
 
 def yellow_bold(s: str) -> str:
-    return f"\x1B[1;33m{s}\x1B[0m"
\ No newline at end of file
+    return f"\x1B[1;33m{s}\x1B[0m"
+
+# `etp run` turns this off unless --verbose is given, so that there is no output for every single test
+_verbose = True
+
+
+def set_verbose(verbose: bool):
+    global _verbose
+    _verbose = verbose
+
+
+def print_verbose(*args, **kwargs):
+    if _verbose:
+        print(*args, **kwargs)
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from tabulate import tabulate
+
+
+@dataclass
+class Span:
+    name: str
+    start_ns: int
+    duration_ns: int
+    thread_name: str
+    thread_id: int
+    args: Dict
+
+
+class Profiler:
+    """Collects the spans of one etp command, possibly from several threads."""
+
+    def __init__(self):
+        self.started_ns = time.perf_counter_ns()
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def print_breakdown(self):
+        wall_ns = time.perf_counter_ns() - self.started_ns
+        totals: Dict[str, List[int]] = {}  # name -> [count, total duration], in order of first appearance
+        for span in self.spans:
+            total = totals.setdefault(span.name, [0, 0])
+            total[0] += 1
+            total[1] += span.duration_ns
+
+        table = [["Phase", "Count", "Total", "Mean", "Of wall time"]]
+        for name, (count, duration_ns) in totals.items():
+            table.append([name, count, f"{duration_ns / 1e9:.3f} s", f"{duration_ns / count / 1e6:.2f} ms",
+                          f"{100 * duration_ns / wall_ns:.1f}%"])
+        print(tabulate(table, headers="firstrow", tablefmt="simple"))
+        # e.g. a test span contains the solution execution and checker execution spans of the test
+        print(f"Wall time: {wall_ns / 1e9:.3f} s. Spans of parallel threads overlap and spans contain other spans, "
+              f"so the percentages don't add up to 100%.")
+
+    def write_trace(self, path: str):
+        # the Trace Event Format of chrome://tracing, which Perfetto (ui.perfetto.dev) also opens
+        pid = os.getpid()
+        events = []
+        thread_names = {}
+        for span in self.spans:
+            thread_names[span.thread_id] = span.thread_name
+            events.append({"name": span.name, "cat": "etp", "ph": "X", "pid": pid, "tid": span.thread_id,
+                           "ts": (span.start_ns - self.started_ns) / 1000, "dur": span.duration_ns / 1000,
+                           "args": span.args})
+        for thread_id, thread_name in thread_names.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+# set by --profile and --trace-file, spans are not recorded otherwise
+_profiler: Optional[Profiler] = None
+
+
+def enable_profiling():
+    global _profiler
+    _profiler = Profiler()
+
+
+@contextmanager
+def span(name: str, **args) -> Iterator[None]:
+    """Records the time spent in the block as a span called `name`. `args` (e.g. the solution and the test)
+    are shown with the span in the trace."""
+    if _profiler is None:
+        yield
+        return
+
+    start_ns = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        thread = threading.current_thread()
+        _profiler.add(Span(name, start_ns, time.perf_counter_ns() - start_ns, thread.name, thread.ident, args))
+
+
+def report_profile(print_breakdown: bool, trace_file: Optional[str]):
+    if _profiler is None:
+        return
+
+    if print_breakdown:
+        _profiler.print_breakdown()
+    if trace_file:
+        _profiler.write_trace(trace_file)
+        print(f"Trace written to {trace_file}")
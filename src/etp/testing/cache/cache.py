@@ -1,32 +1,168 @@
 import os.path
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from sqlite3 import Connection, Cursor
-from typing import Optional, Tuple
+from typing import Optional, List, Tuple, Dict
 
+from etp.common.test import Test
+from etp.testing.cache.hashing import hash_file, hash_string, new_hasher
 from etp.testing.test_result import TestResult
-from etp.testing.verdict import FailedVerdict
-
-
-def get_cached_test_result(solution_path: str, test_index: int,
-                           context_hash, solution_hash, io_hash) -> Optional[TestResult]:
-    conn, cursor = open_cache_db()
-    cursor.execute("SELECT * FROM runs WHERE io_hash = ? AND solution_path = ?",
-                   (io_hash.hexdigest(), solution_path,))
-    result = cursor.fetchone()
-    if result is None:
-        conn.close()
-        return None
-
-    (cached_index, cached_solution_path,
-     cached_context_hash, cached_solution_hash, cached_io_hash,
-     verdict_type, verdict_value, time_milliseconds, exact_match, comment) = result
-    if context_hash.hexdigest() != cached_context_hash or \
-            solution_hash.hexdigest() != cached_solution_hash or \
-            io_hash.hexdigest() != cached_io_hash:
-        conn.close()
-        return None  # stale copy in cache
+from etp.testing.verdict import FailedVerdict, Verdict
 
+RUNS_COLUMNS = ["test_index", "solution_path", "context_hash", "solution_hash", "io_hash",
+                "verdict_type", "verdict_value", "time_milliseconds", "exact_match", "comment", "memory_kb",
+                "checker_time_ms", "time_min_ms", "time_spread_ms"]
+
+# a file modified this recently may still change without its size or mtime changing,
+# so its digest is not remembered for later runs
+RACY_MTIME_NS = 2 * 10**9
+
+
+class Cache:
+    """The sqlite database in .etp/cache/cache.db. One object (and one connection) is meant to be used
+    for a whole command. Writes are committed in batches, so that a run doesn't fsync after every
+    test; call commit() or close() (or use it as a context manager) to make sure everything is saved.
+    All methods may be called from several threads."""
+
+    def __init__(self, batch_size: int = 256, hash_algorithm: str = "sha256"):
+        Path(".etp", "cache").mkdir(parents=True, exist_ok=True)
+        new_hasher(hash_algorithm)  # fails early if the algorithm isn't available
+
+        self.batch_size = batch_size
+        self.hash_algorithm = hash_algorithm
+        self.file_digests = {}  # path -> (stat key, digest) of files already hashed during this command
+        self.uncommitted_writes = 0
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(".etp", "cache", "cache.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")  # with WAL, a crash can't corrupt the database
+        create_tables(self.conn.cursor())
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def query(self, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        # sqlite3 keeps compiled statements for recently used SQL strings, so the same
+        # queries aren't prepared again on every call
+        with self.lock:
+            return self.conn.execute(sql, parameters).fetchall()
+
+    def query_one(self, sql: str, parameters: Tuple = ()) -> Optional[Tuple]:
+        with self.lock:
+            return self.conn.execute(sql, parameters).fetchone()
+
+    def write(self, sql: str, parameters: Tuple = ()):
+        with self.lock:
+            self.conn.execute(sql, parameters)
+            self.uncommitted_writes += 1
+            if self.uncommitted_writes >= self.batch_size:
+                self.commit()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+            self.uncommitted_writes = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def file_digest(self, path: str) -> str:
+        """Hash of the contents of the file. It is remembered together with the size, mtime and inode of
+        the file and only computed again when one of them changes, so large test sets aren't read on
+        every run."""
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        with self.lock:
+            known = self.file_digests.get(path)
+        if known is not None and known[0] == key:
+            return known[1]
+
+        row = self.query_one("SELECT size, mtime_ns, inode, digest FROM file_hashes "
+                             "WHERE path = ? AND algorithm = ?", (path, self.hash_algorithm))
+        if row is not None and tuple(row[:3]) == key:
+            digest = row[3]
+        else:
+            digest = hash_file(path, new_hasher(self.hash_algorithm)).hexdigest()
+            if time.time_ns() - stat.st_mtime_ns > RACY_MTIME_NS:
+                self.write("INSERT OR REPLACE INTO file_hashes VALUES(?, ?, ?, ?, ?, ?)",
+                           (path, self.hash_algorithm, stat.st_size, stat.st_mtime_ns, stat.st_ino, digest))
+
+        with self.lock:
+            self.file_digests[path] = (key, digest)
+        return digest
+
+    def get_io_hash(self, test: Test):
+        # identifies the test files in the runs table
+        return hash_string(f"{self.file_digest(test.input_path)} {self.file_digest(test.output_path)}")
+
+    def get_timings(self, solution_path: str, solution_hash) -> Dict[str, Tuple[Verdict, int]]:
+        """(verdict, time in ms) of every cached run of this build of the solution, keyed by io_hash
+        hexdigest, regardless of the settings it was run with."""
+        rows = self.query("SELECT io_hash, verdict_type, time_milliseconds FROM runs "
+                          "WHERE solution_path = ? AND solution_hash = ? AND time_milliseconds >= 0",
+                          (solution_path, solution_hash.hexdigest()))
+        return {io_hash: (0.0 if verdict_type == 0 else FailedVerdict(verdict_type), time_milliseconds)
+                for io_hash, verdict_type, time_milliseconds in rows}
+
+    def get_test_results(self, solution_path: str, context_hash, solution_hash) -> Dict[str, TestResult]:
+        """All cached results of this build of the solution in this context, keyed by io_hash hexdigest.
+        One query per solution is much cheaper than one per test."""
+        rows = self.query("SELECT io_hash, verdict_type, verdict_value, time_milliseconds, exact_match, "
+                          "comment, memory_kb, checker_time_ms, time_min_ms, time_spread_ms FROM runs "
+                          "WHERE solution_path = ? AND context_hash = ? AND solution_hash = ?",
+                          (solution_path, context_hash.hexdigest(), solution_hash.hexdigest()))
+        return {row[0]: _row_to_test_result(*row[1:]) for row in rows}
+
+    def get_checker_result(self, checker_hash: str, input_hash: str, answer_hash: str,
+                           output_hash: str) -> Optional[Tuple[float, str]]:
+        row = self.query_one("SELECT score, comment FROM checker_results "
+                             "WHERE checker_hash = ? AND input_hash = ? AND answer_hash = ? AND output_hash = ?",
+                             (checker_hash, input_hash, answer_hash, output_hash))
+        return None if row is None else (row[0], row[1])
+
+    def put_checker_result(self, checker_hash: str, input_hash: str, answer_hash: str, output_hash: str,
+                           score: float, comment: str):
+        self.write("INSERT OR REPLACE INTO checker_results VALUES(?, ?, ?, ?, ?, ?)",
+                   (checker_hash, input_hash, answer_hash, output_hash, score, comment))
+
+    def put_test_result(self, solution_path: str, test_index: int,
+                        context_hash, solution_hash, io_hash, result: TestResult):
+        if isinstance(result.verdict, FailedVerdict):
+            verdict_type = result.verdict.value
+            verdict_value = -1 if result.original_score is None else result.original_score
+        else:
+            verdict_type = 0
+            verdict_value = result.verdict
+
+        if result.time_milliseconds is None:
+            time_milliseconds = -1
+        else:
+            time_milliseconds = result.time_milliseconds
+
+        if result.exact_match is None:
+            exact_match = -1
+        else:
+            exact_match = int(result.exact_match)
+
+        data = (test_index, solution_path,
+                context_hash.hexdigest(), solution_hash.hexdigest(), io_hash.hexdigest(),
+                verdict_type, verdict_value, time_milliseconds, exact_match, result.comment, result.memory_kb,
+                result.checker_time_ms, result.time_min_ms, result.time_spread_ms)
+
+        # the unique index on (io_hash, solution_path) replaces the previous row
+        self.write("INSERT OR REPLACE INTO runs(" + ", ".join(RUNS_COLUMNS) + ") "
+                   "VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", data)
+
+
+def _row_to_test_result(verdict_type, verdict_value, time_milliseconds, exact_match, comment, memory_kb,
+                        checker_time_ms, time_min_ms, time_spread_ms) -> TestResult:
     original_score = None
     if verdict_type == 0:
         verdict = float(verdict_value)
@@ -35,7 +171,6 @@ def get_cached_test_result(solution_path: str, test_index: int,
         if not verdict_value < 0:
             original_score = float(verdict_value)
 
-
     if time_milliseconds < 0:
         time_milliseconds = None
 
@@ -46,46 +181,11 @@ def get_cached_test_result(solution_path: str, test_index: int,
     else:
         exact_match = None
 
-    conn.close()
-    return TestResult(verdict, time_milliseconds, exact_match, comment, original_score)
-
-
-def cache_test_result(solution_path: str, test_index: int,
-                      context_hash, solution_hash, io_hash, result: TestResult):
-    if isinstance(result.verdict, FailedVerdict):
-        verdict_type = result.verdict.value
-        verdict_value = -1 if result.original_score is None else result.original_score
-    else:
-        verdict_type = 0
-        verdict_value = result.verdict
-
-    if result.time_milliseconds is None:
-        time_milliseconds = -1
-    else:
-        time_milliseconds = result.time_milliseconds
-
-    if result.exact_match is None:
-        exact_match = -1
-    else:
-        exact_match = int(result.exact_match)
-
-    data = (test_index, solution_path,
-            context_hash.hexdigest(), solution_hash.hexdigest(), io_hash.hexdigest(),
-            verdict_type, verdict_value, time_milliseconds, exact_match, result.comment)
-
-    conn, cursor = open_cache_db()
-    cursor.execute("DELETE FROM runs WHERE io_hash = ? and solution_path = ?",
-                   (io_hash.hexdigest(), solution_path))
-    cursor.execute("INSERT INTO runs VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", data)
-    conn.commit()
-    conn.close()
-
+    return TestResult(verdict, time_milliseconds, exact_match, comment, original_score, memory_kb, checker_time_ms,
+                      time_min_ms, time_spread_ms)
 
-def open_cache_db() -> Tuple[Connection, Cursor]:
-    Path(".etp", "cache").mkdir(parents=True, exist_ok=True)
 
-    conn = sqlite3.connect(os.path.join(".etp", "cache", "cache.db"))
-    cursor = conn.cursor()
+def create_tables(cursor: sqlite3.Cursor):
     cursor.execute("""
 CREATE TABLE IF NOT EXISTS runs(
     test_index INTEGER,
@@ -97,11 +197,65 @@ CREATE TABLE IF NOT EXISTS runs(
     verdict_value REAL,
     time_milliseconds INTEGER,
     exact_match INTEGER,
-    comment TEXT
+    comment TEXT,
+    memory_kb INTEGER,
+    checker_time_ms INTEGER,
+    time_min_ms INTEGER,
+    time_spread_ms INTEGER
 )""")
+
+    # caches created by older versions lack the columns added later
+    existing_columns = [row[1] for row in cursor.execute("PRAGMA table_info(runs)")]
+    for column in ["memory_kb", "checker_time_ms", "time_min_ms", "time_spread_ms"]:
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE runs ADD COLUMN {column} INTEGER")
+
     cursor.execute("""
 CREATE UNIQUE INDEX IF NOT EXISTS
 ix_io_path ON runs (io_hash, solution_path)
 """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_path ON runs (solution_path)")  # for get_test_results
+
+    # manifests of `etp generate`, see etp.generation.input_manifest and etp.generation.output_manifest
+    cursor.execute("""
+CREATE TABLE IF NOT EXISTS generated_inputs(
+    test_index INTEGER PRIMARY KEY,
+    command_hash TEXT,
+    generators_hash TEXT,
+    files_hash TEXT
+)""")
+    cursor.execute("""
+CREATE TABLE IF NOT EXISTS generated_outputs(
+    model_hash TEXT,
+    input_hash TEXT,
+    output_hash TEXT,
+    PRIMARY KEY (model_hash, input_hash)
+)""")
+
+    # see etp.testing.cms_checker_executor
+    cursor.execute("""
+CREATE TABLE IF NOT EXISTS checker_results(
+    checker_hash TEXT,
+    input_hash TEXT,
+    answer_hash TEXT,
+    output_hash TEXT,
+    score REAL,
+    comment TEXT,
+    PRIMARY KEY (checker_hash, input_hash, answer_hash, output_hash)
+)""")
 
-    return conn, cursor
+    # see Cache.file_digest; older versions keyed it by path alone, so the digests of different
+    # algorithms replaced each other; it only saves reading files, so it is simply recreated
+    key_columns = [row[1] for row in cursor.execute("PRAGMA table_info(file_hashes)") if row[5] > 0]
+    if key_columns == ["path"]:
+        cursor.execute("DROP TABLE file_hashes")
+    cursor.execute("""
+CREATE TABLE IF NOT EXISTS file_hashes(
+    path TEXT,
+    algorithm TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER,
+    digest TEXT,
+    PRIMARY KEY (path, algorithm)
+)""")
@@ -1,5 +1,23 @@
 import hashlib
 
+from etp.etp_exception import EtpException
+
+# names accepted by the hash_algorithm key in task.yaml
+HASH_ALGORITHMS = ["sha256", "xxh3_128"]
+
+
+def new_hasher(algorithm: str = "sha256"):
+    if algorithm == "sha256":
+        return hashlib.sha256()
+    if algorithm == "xxh3_128":
+        try:
+            import xxhash
+        except ImportError:
+            raise EtpException("hash_algorithm xxh3_128 needs the xxhash package, install it with "
+                               "`pip install xxhash`")
+        return xxhash.xxh3_128()
+    raise EtpException(f"Unknown hash_algorithm {algorithm}, expected one of: {', '.join(HASH_ALGORITHMS)}")
+
 
 def hash_file(filename: str, hasher = None):
     if hasher is None:
@@ -7,7 +25,7 @@ def hash_file(filename: str, hasher = None):
 
     with open(filename, "rb") as f:
         while True:
-            data = f.read(1 << 16)
+            data = f.read(1 << 20)
             if not data:
                 break
             hasher.update(data)
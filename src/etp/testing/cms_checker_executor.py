@@ -1,27 +1,74 @@
-import subprocess
+import math
+from typing import Optional
 
+from etp.common.process import run_process
+from etp.common.run import WALL_TIMEOUT_FACTOR
 from etp.print_utils import red_bold
-from etp.testing.testing_context import CheckerExecutor
+from etp.testing.cache.cache import Cache
+from etp.testing.cache.hashing import hash_file, new_hasher
+from etp.testing.testing_context import CheckerExecutor, CheckerResult
 from etp.common.test import Test
-from etp.testing.verdict import Verdict, FailedVerdict
+from etp.testing.verdict import FailedVerdict
 
 
 class CmsCheckerExecutor(CheckerExecutor):
-    def __init__(self, path):
+    def __init__(self, path, cache: Optional[Cache] = None,
+                 time_limit: float = None, memory_limit_mb: int = None):
         self.path = path
+        # if set, verdicts are remembered by the contents of the checker and the three files,
+        # so identical outputs (e.g. of different correct solutions) are checked only once
+        self.cache = cache
+        # a checker that hangs on some output must not stall the whole run; like for solutions, the limit
+        # is on CPU time (so a busy machine doesn't make it fail), with a longer wall clock limit as a backstop
+        self.time_limit = time_limit
+        self.memory_limit_mb = memory_limit_mb
 
-    def execute_checker(self, test: Test, output_path: str) -> [Verdict, str]:
+    def execute_checker(self, test: Test, output_path: str, exact_match: bool = False) -> CheckerResult:
+        # a checker may give less than 1.0 even to the correct output, so it always runs
+        if self.cache is None:
+            return self.run_checker(test, output_path)
+
+        # the output file is written again for every test, so it is hashed directly
+        key = (self.cache.file_digest(self.path),
+               self.cache.file_digest(test.input_path),
+               self.cache.file_digest(test.output_path),
+               hash_file(output_path, new_hasher(self.cache.hash_algorithm)).hexdigest())
+        known = self.cache.get_checker_result(*key)
+        if known is not None:
+            return CheckerResult(*known)
+
+        result = self.run_checker(test, output_path)
+        if not isinstance(result.verdict, FailedVerdict):
+            self.cache.put_checker_result(*key, result.verdict, result.message)
+        return result
+
+    def run_checker(self, test: Test, output_path: str) -> CheckerResult:
         cmd = [self.path, test.input_path, test.output_path, output_path]
-        exec_result = subprocess.run(cmd, text=True, capture_output=True)
+        exec_result = run_process(cmd, capture_output=True,
+                                  timeout=None if self.time_limit is None else WALL_TIMEOUT_FACTOR * self.time_limit,
+                                  cpu_limit_s=None if self.time_limit is None else math.ceil(self.time_limit),
+                                  memory_limit_kb=None if self.memory_limit_mb is None else 1024 * self.memory_limit_mb)
+        stdout = exec_result.stdout.decode(errors="replace")
+
+        # a wrapper script may even exit with 0 (and print a score) after its child got SIGXCPU,
+        # so the CPU time alone decides
+        cpu_limit_exceeded = self.time_limit is not None and \
+            exec_result.cpu_time_ms >= 950 * math.ceil(self.time_limit)
+        if exec_result.timed_out or cpu_limit_exceeded:
+            print(red_bold("FAILED:"), f"checker exceeded its time limit of {self.time_limit} s")
+            return CheckerResult(FailedVerdict.JudgementFailed,
+                                 f"checker exceeded its time limit of {self.time_limit} s", exec_result.cpu_time_ms)
 
         if exec_result.returncode != 0:
             print(red_bold("FAILED:"), f"checker returned non-zero exit code {exec_result.returncode}")
-            return FailedVerdict.JudgementFailed, "checker returned non-zero exit code"
+            return CheckerResult(FailedVerdict.JudgementFailed, "checker returned non-zero exit code",
+                                 exec_result.cpu_time_ms)
 
         try:
-            fraction = float(exec_result.stdout)
+            fraction = float(stdout)
         except ValueError:
-            print(red_bold("FAILED:"), f"checker returned {exec_result.stdout} which is not a float")
-            return FailedVerdict.JudgementFailed, f"checker returned {exec_result.stdout} which is not a float"
+            print(red_bold("FAILED:"), f"checker returned {stdout} which is not a float")
+            return CheckerResult(FailedVerdict.JudgementFailed, f"checker returned {stdout} which is not a float",
+                                 exec_result.cpu_time_ms)
 
-        return fraction, exec_result.stderr
+        return CheckerResult(fraction, exec_result.stderr.decode(errors="replace"), exec_result.cpu_time_ms)
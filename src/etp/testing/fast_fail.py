@@ -0,0 +1,35 @@
+import threading
+from typing import Dict, List, Set
+
+from etp.common.solution_descriptor import SolutionDescriptor
+from etp.common.test import Test
+from etp.config.genfile import Genfile
+from etp.testing.test_result import TestResult
+from etp.testing.verdict import get_value
+
+
+class FastFailTracker:
+    """For score types where one test with score 0 makes the whole subtask 0 (GroupMin, GroupMul),
+    remembers which subtasks of each solution are already lost. A test can be skipped once every
+    subtask containing it (including the ones that import it through deps) is lost."""
+
+    def __init__(self, genfile: Genfile):
+        self.groups_of_test: Dict[int, List[int]] = {test.index: [] for test in genfile.tests}
+        for i, group in enumerate(genfile.groups):
+            for test in group.tests:
+                self.groups_of_test[test.index].append(i)
+
+        self.lost_groups: Dict[str, Set[int]] = {}  # solution path -> indices of groups with a 0
+        self.lock = threading.Lock()
+
+    def register_test_result(self, solution: SolutionDescriptor, test: Test, result: TestResult):
+        if get_value(result.verdict) > 0.0:
+            return
+
+        with self.lock:
+            self.lost_groups.setdefault(solution.path, set()).update(self.groups_of_test[test.index])
+
+    def can_skip(self, solution: SolutionDescriptor, test: Test) -> bool:
+        with self.lock:
+            lost = self.lost_groups.get(solution.path, set())
+            return all(group in lost for group in self.groups_of_test[test.index])
@@ -10,7 +10,8 @@ def format_result(result: TestResult) -> str:
         FailedVerdict.MemoryLimitExceeded: "ML",
         FailedVerdict.JudgementFailed: "FL",
         FailedVerdict.UnsupportedLanguage: "UL",
-        FailedVerdict.HardTimeLimitExceeded: "TL"
+        FailedVerdict.HardTimeLimitExceeded: "TL",
+        FailedVerdict.Skipped: "SK"
     }
 
     ret = ""
@@ -20,6 +21,8 @@ def format_result(result: TestResult) -> str:
         if result.verdict == FailedVerdict.JudgementFailed or \
                 result.verdict == FailedVerdict.UnsupportedLanguage:
             ret += "\x1B[1;35m"  # bold magenta
+        elif result.verdict == FailedVerdict.Skipped:
+            ret += "\x1B[0;90m"  # grey
         else:
             ret += "\x1B[0;31m"  # normal red
     else:
@@ -54,6 +57,10 @@ def format_result(result: TestResult) -> str:
     if result.verdict == FailedVerdict.HardTimeLimitExceeded:
         ret += ">"
     ret += f"{result.time_milliseconds} ms"
+    if result.noisy_timing:
+        ret += "~"
+    if result.memory_kb is not None:
+        ret += f" {result.memory_kb / 1024:.1f} MB"
     return ret
 
 
@@ -0,0 +1,156 @@
+import os.path
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from tabulate import tabulate
+
+from etp.common.solution_descriptor import SolutionDescriptor
+from etp.common.test import Test
+from etp.config.genfile import Genfile
+from etp.testing.test_result import TestResult
+from etp.testing.test_result_tracker import TestResultListener
+from etp.testing.verdict import get_value
+
+# the live view is redrawn at most this often, redrawing after every result of a fast solution is too slow
+REDRAW_INTERVAL_S = 0.1
+
+
+class _LiveStream:
+    # stands in for sys.stdout / sys.stderr while the live view is shown, so that messages printed by
+    # other threads (checker failures, compiler warnings) appear above the view instead of inside it
+    def __init__(self, view: "ProgressView", stream):
+        self.view = view
+        self.stream = stream
+        self.pending = ""  # text after the last newline, written out once its line is complete
+
+    def write(self, text: str) -> int:
+        self.view.write_above(self, text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class ProgressView(TestResultListener):
+    """Shows the progress of `etp run` while the tests run. On a terminal, a solution × subtask table
+    (tests done out of all tests, red once a test failed) is redrawn in place, with the throughput
+    and the estimated time left. Otherwise, a line is printed whenever a solution is finished.
+
+    While the view is entered, everything printed goes through it, so that the table stays below."""
+
+    def __init__(self, genfile: Genfile, solutions: List[SolutionDescriptor],
+                 get_score: Callable[[SolutionDescriptor], float], live: bool):
+        self.genfile = genfile
+        self.solutions = solutions  # filled in by the caller as the solutions are found
+        self.get_score = get_score
+        self.live = live
+
+        self.done: Dict[str, Set[int]] = {}  # solution path -> indices of finished tests
+        self.failed: Dict[str, Set[int]] = {}
+        self.started = time.monotonic()
+        self.last_redraw = 0.0
+        self.drawn_lines = 0
+        self.lock = threading.RLock()  # __exit__ writes out unfinished lines through write_above()
+        self.stdout = sys.stdout
+        self.stderr = sys.stderr
+
+    def on_test_result(self, solution: SolutionDescriptor, test: Test, result: TestResult,
+                       solution_hash: Optional[str]):
+        with self.lock:
+            self.done.setdefault(solution.path, set()).add(test.index)
+            if get_value(result.verdict) < 1.0:
+                self.failed.setdefault(solution.path, set()).add(test.index)
+            self.update(solution)
+
+    def on_compile_time_fail(self, solution: SolutionDescriptor, result: TestResult):
+        with self.lock:
+            self.done[solution.path] = {test.index for test in self.genfile.tests}
+            self.failed[solution.path] = {test.index for test in self.genfile.tests}
+            self.update(solution)
+
+    def update(self, solution: SolutionDescriptor):
+        finished = len(self.done[solution.path]) == len(self.genfile.tests)
+        if not self.live:
+            if finished:
+                passed = len(self.genfile.tests) - len(self.failed.get(solution.path, set()))
+                print(f"{solution.path}: {passed}/{len(self.genfile.tests)} tests passed, "
+                      f"score {self.get_score(solution):g}, {time.monotonic() - self.started:.1f} s")
+            return
+
+        now = time.monotonic()
+        if finished or now - self.last_redraw >= REDRAW_INTERVAL_S:
+            self.last_redraw = now
+            self.redraw()
+
+    def redraw(self):
+        table = [[""] + [group.name or str(i + 1) for i, group in enumerate(self.genfile.groups)]]
+        for solution in self.solutions:
+            row = [os.path.basename(solution.path)]
+            for group in self.genfile.groups:
+                indices = {test.index for test in group.tests}
+                done = len(indices & self.done.get(solution.path, set()))
+                if indices & self.failed.get(solution.path, set()):
+                    color = "\x1B[0;31m"  # normal red
+                elif done == len(indices):
+                    color = "\x1B[0;32m"  # normal green
+                else:
+                    color = None
+                cell = f"{done}/{len(indices)}"
+                row.append(f"{color}{cell}\x1B[0m" if color else cell)
+            table.append(row)
+
+        total = len(self.solutions) * len(self.genfile.tests)
+        done = sum(len(indices) for indices in self.done.values())
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        status = f"{done}/{total} tests, {rate:.1f} tests/s"
+        if 0 < done < total:
+            status += f", about {(total - done) / rate:.0f} s left"
+
+        text = tabulate(table, headers="firstrow", tablefmt="simple") + "\n" + status + "\n"
+        self.clear()
+        self.stdout.write(text)
+        self.stdout.flush()
+        self.drawn_lines = text.count("\n")
+
+    def clear(self):
+        # moves to the first line of the previous drawing and erases everything below
+        if self.drawn_lines > 0:
+            self.stdout.write(f"\x1B[{self.drawn_lines}F\x1B[J")
+            self.drawn_lines = 0
+
+    def write_above(self, stream: _LiveStream, text: str):
+        with self.lock:
+            stream.pending += text
+            lines, newline, stream.pending = stream.pending.rpartition("\n")
+            if not newline:
+                return
+            self.clear()
+            self.stdout.flush()
+            stream.stream.write(lines + newline)
+            stream.stream.flush()
+            if self.solutions:
+                self.redraw()
+
+    def __enter__(self):
+        if self.live:
+            sys.stdout = _LiveStream(self, self.stdout)
+            sys.stderr = _LiveStream(self, self.stderr)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # the final result tables are printed afterwards, so the live view is removed
+        with self.lock:
+            if self.live:
+                for stream in [sys.stdout, sys.stderr]:
+                    if isinstance(stream, _LiveStream) and stream.pending:
+                        stream.write("\n")
+                sys.stdout = self.stdout
+                sys.stderr = self.stderr
+                self.clear()
+                self.stdout.flush()
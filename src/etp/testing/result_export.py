@@ -0,0 +1,102 @@
+import csv
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Protocol, TextIO
+
+from etp.common.solution_descriptor import SolutionDescriptor
+from etp.common.test import Test
+from etp.config.genfile import Genfile
+from etp.testing.test_result import TestResult
+from etp.testing.test_result_tracker import TestResultListener
+from etp.testing.verdict import FailedVerdict, get_value
+
+# columns of --output-csv, also the keys used in --output-json
+RECORD_FIELDS = ["type", "solution", "solution_hash", "test", "subtask", "verdict", "score", "max_score",
+                 "time_ms", "memory_kb", "exact_match", "original_score", "checker_time_ms",
+                 "time_min_ms", "time_spread_ms", "comment"]
+
+
+class RecordFormat(Protocol):
+    # writes one record to the stream it was created with
+    def write_record(self, record: Dict[str, Any]):
+        ...
+
+
+class JsonRecordFormat(RecordFormat):
+    # JSON Lines: one object per line, so that a partially written file can still be read
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def write_record(self, record: Dict[str, Any]):
+        self.stream.write(json.dumps(record) + "\n")
+
+
+class CsvRecordFormat(RecordFormat):
+    def __init__(self, stream: TextIO):
+        self.writer = csv.DictWriter(stream, fieldnames=RECORD_FIELDS)
+        self.writer.writeheader()
+
+    def write_record(self, record: Dict[str, Any]):
+        self.writer.writerow(record)
+
+
+class ResultWriter(TestResultListener):
+    """Writes every result to a file as soon as it is registered, so that the file is useful even if
+    the run doesn't finish. There is one record per test result ("test"), compilation failure
+    ("compile_fail"), subtask score ("subtask") and total score ("total"); the scores are written
+    at the end of the run. record_format is e.g. JsonRecordFormat or CsvRecordFormat."""
+
+    def __init__(self, path: str, genfile: Genfile, record_format: Callable[[TextIO], RecordFormat]):
+        self.stream = open(path, "w", newline="")
+        self.format = record_format(self.stream)
+        self.genfile = genfile
+        self.lock = threading.Lock()
+
+    def on_test_result(self, solution: SolutionDescriptor, test: Test, result: TestResult,
+                       solution_hash: Optional[str]):
+        self.write({"type": "test",
+                    "solution": solution.path,
+                    "solution_hash": solution_hash,
+                    "test": test.index,
+                    "verdict": format_verdict(result),
+                    "score": get_value(result.verdict),
+                    "time_ms": result.time_milliseconds,
+                    "memory_kb": result.memory_kb,
+                    "exact_match": result.exact_match,
+                    "original_score": result.original_score,
+                    "checker_time_ms": result.checker_time_ms,
+                    "time_min_ms": result.time_min_ms,
+                    "time_spread_ms": result.time_spread_ms,
+                    "comment": result.comment})
+
+    def on_compile_time_fail(self, solution: SolutionDescriptor, result: TestResult):
+        self.write({"type": "compile_fail",
+                    "solution": solution.path,
+                    "verdict": format_verdict(result),
+                    "score": 0.0})
+
+    def write_score(self, solution: SolutionDescriptor, score: float, subtasks: List[Dict[str, Any]]):
+        for subtask, group in zip(subtasks, self.genfile.groups):
+            self.write({"type": "subtask",
+                        "solution": solution.path,
+                        "subtask": group.name or subtask["idx"],
+                        "score": subtask["score_fraction"] * subtask["max_score"],
+                        "max_score": subtask["max_score"]})
+        self.write({"type": "total",
+                    "solution": solution.path,
+                    "score": score,
+                    "max_score": sum(subtask["max_score"] for subtask in subtasks)})
+
+    def write(self, record: Dict[str, Any]):
+        with self.lock:
+            self.format.write_record(record)
+            self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+def format_verdict(result: TestResult) -> str:
+    if isinstance(result.verdict, FailedVerdict):
+        return result.verdict.name
+    return str(result.verdict)
@@ -0,0 +1,52 @@
+from typing import Any, Dict, List, Tuple
+
+from etp.common.solution_descriptor import SolutionDescriptor
+from etp.common.test import Test
+from etp.testing.cache.cache import Cache
+
+# assumed for tests that no solution was run on yet, so that they go before tests known to pass
+UNKNOWN_FAILURE_RATE = 0.5
+
+
+class HistoryTestOrder:
+    """Orders the tests of a solution using the results of earlier runs in the cache (of this
+    solution and of the others): tests that are likely to fail go first, so that a wrong solution
+    is found out (and --fast-fail can skip tests) as early as possible. Among tests that are
+    about as likely to fail, short tests go first when tests run one at a time, and long tests go
+    first when they run in parallel (longest processing time first), so that the workers finish
+    at about the same time."""
+
+    def __init__(self, cache: Cache, io_hashes: Dict[int, Any], jobs: int):
+        self.jobs = jobs
+        # test index -> list of (solution path, failed, time in ms) for runs on the current test files
+        self.history: Dict[int, List[Tuple[str, bool, int]]] = {index: [] for index in io_hashes}
+
+        index_by_hash = {io_hash.hexdigest(): index for index, io_hash in io_hashes.items()}
+        rows = cache.query("SELECT io_hash, solution_path, verdict_type, verdict_value, time_milliseconds "
+                           "FROM runs")
+        for io_hash, solution_path, verdict_type, verdict_value, time_milliseconds in rows:
+            if io_hash in index_by_hash:
+                failed = verdict_type != 0 or verdict_value < 1.0
+                self.history[index_by_hash[io_hash]].append((solution_path, failed, max(time_milliseconds, 0)))
+
+    def order(self, solution: SolutionDescriptor, tests: List[Test]) -> List[Test]:
+        def key(test: Test):
+            failure_rate, time_ms = self.estimate(solution, test)
+            # rounded, so that the time decides between tests with similar failure rates
+            return -round(failure_rate, 1), time_ms if self.jobs == 1 else -time_ms
+
+        return sorted(tests, key=key)
+
+    def estimate(self, solution: SolutionDescriptor, test: Test) -> Tuple[float, float]:
+        runs = self.history[test.index]
+        if not runs:
+            return UNKNOWN_FAILURE_RATE, 0.0
+
+        failure_rate = sum(failed for _, failed, _ in runs) / len(runs)
+        time_ms = sum(time for _, _, time in runs) / len(runs)
+        for solution_path, failed, time in runs:
+            if solution_path == solution.path:
+                # the last result of the same solution (an earlier version of it) says the most
+                failure_rate = (failure_rate + failed) / 2
+                time_ms = time
+        return failure_rate, time_ms
@@ -3,6 +3,9 @@ from typing import Optional
 
 from etp.testing.verdict import Verdict
 
+# with --repeat, a timing is noisy if the slowest and the fastest run differ by more than this part of the median
+NOISY_SPREAD = 0.1
+
 
 @dataclass
 class TestResult:
@@ -10,4 +13,13 @@ class TestResult:
     time_milliseconds: Optional[int] = None
     exact_match: Optional[bool] = None
     comment: str = None
-    original_score: float = None  # if time taken is between TL and double TL, checker is run
\ No newline at end of file
+    original_score: float = None  # if time taken is between TL and double TL, checker is run
+    memory_kb: Optional[int] = None  # peak resident set size
+    checker_time_ms: Optional[int] = None  # CPU time of the checker, None if the output wasn't checked
+    # only for tests that were run several times (--repeat), time_milliseconds is then the median
+    time_min_ms: Optional[int] = None
+    time_spread_ms: Optional[int] = None  # slowest minus fastest run
+
+    @property
+    def noisy_timing(self) -> bool:
+        return self.time_spread_ms is not None and self.time_spread_ms > NOISY_SPREAD * self.time_milliseconds
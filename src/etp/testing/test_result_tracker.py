@@ -1,20 +1,42 @@
-from typing import Protocol, Optional
+from typing import Protocol, Optional, List
 
 from etp.common.solution_descriptor import SolutionDescriptor
 from etp.common.test import Test
 from etp.testing.test_result import TestResult
 
 
+class TestResultListener(Protocol):
+    # called as soon as each result is known, possibly from several threads
+    def on_test_result(self, solution: SolutionDescriptor, test: Test, result: TestResult,
+                       solution_hash: Optional[str]):
+        ...
+
+    def on_compile_time_fail(self, solution: SolutionDescriptor, result: TestResult):
+        ...
+
+
 class TestResultTracker:
     def __init__(self):
         self.compile_time_fails = {}
         self.results = {}
+        self.solution_hashes = {}  # solution path -> hexdigest of the executable that was tested
+        self.listeners: List[TestResultListener] = []
+
+    def add_listener(self, listener: TestResultListener):
+        self.listeners.append(listener)
+
+    def register_solution_hash(self, solution: SolutionDescriptor, solution_hash: str):
+        self.solution_hashes[solution.path] = solution_hash
 
     def register_test_result(self, solution: SolutionDescriptor, test: Test, result: TestResult):
         self.results[(solution.path, test.index)] = result
+        for listener in self.listeners:
+            listener.on_test_result(solution, test, result, self.solution_hashes.get(solution.path))
 
     def register_compile_time_fail(self, solution: SolutionDescriptor, result: TestResult):
         self.compile_time_fails[solution.path] = result
+        for listener in self.listeners:
+            listener.on_compile_time_fail(solution, result)
 
     def get_result(self, solution: SolutionDescriptor, test: Test) -> Optional[TestResult]:
         if solution.path in self.compile_time_fails:
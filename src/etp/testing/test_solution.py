@@ -1,87 +1,210 @@
 import os.path
+import statistics
 import subprocess
-from pathlib import Path
-from typing import List
-
-from etp.common.compile import compile_solution
-from etp.common.run import run_solution
+import tempfile
+from concurrent.futures import Executor, Future, as_completed
+from dataclasses import dataclass
+from functools import partial
+from typing import List, Any, Dict, Optional
+
+from etp.common.compare import describe_difference
+from etp.common.compile import compile_solution, get_executable_path
+from etp.common.run import run_solution, RunResult
 from etp.common.solution_descriptor import SolutionDescriptor
 from etp.common.test import Test
-from etp.testing.cache.cache import get_cached_test_result, cache_test_result
+from etp.common.workspace import WorkspacePool
+from etp.print_utils import print_verbose
+from etp.profiling import span
 from etp.testing.cache.hashing import hash_file
 from etp.testing.test_result import TestResult
 from etp.testing.test_result_tracker import TestResultTracker
 from etp.testing.testing_context import TestingContext
 from etp.testing.verdict import FailedVerdict
 
+# with --repeat, tests whose time is within this part of the time limit from it are run again
+REPEAT_MARGIN = 0.2
 
-def test_solution(solution: SolutionDescriptor,
-                  context: TestingContext,
-                  tests: List[Test],
-                  tracker: TestResultTracker):
-    print(f"Testing solution at {solution.path}...")
 
-    working_dir = os.path.join(".etp", "working")
-    Path(working_dir).mkdir(parents=True, exist_ok=True)
-    Path(".etp", "output").mkdir(parents=True, exist_ok=True)
+@dataclass
+class PendingTestResult:
+    solution: SolutionDescriptor
+    test: Test
+    solution_hash: Any
+    io_hash: Any
+    future: Future
+
 
+def compile_for_testing(solution: SolutionDescriptor, tracker: TestResultTracker,
+                        use_compile_cache: bool = True) -> Optional[str]:
+    # returns the path of the executable, or None if compilation failed (which is registered)
+    executable_path = get_executable_path(solution)
     try:
-        compile_solution(solution, os.path.join(working_dir, solution.name))
+        with span("compile", solution=solution.path):
+            compile_solution(solution, executable_path, use_compile_cache)
     except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
         tracker.register_compile_time_fail(solution, TestResult(FailedVerdict.CompilationError))
-        return
+        return None
+    return executable_path
 
-    solution_hash = hash_file(os.path.join(working_dir, solution.name))
 
+def test_solution(solution: SolutionDescriptor,
+                  executable_path: str,
+                  context: TestingContext,
+                  tests: List[Test],
+                  io_hashes: Dict[int, Any],
+                  tracker: TestResultTracker,
+                  executor: Executor,
+                  workspaces: WorkspacePool) -> List[PendingTestResult]:
+    print_verbose(f"Testing solution at {solution.path}...")
+
+    with span("hashing", solution=solution.path):
+        solution_hash = hash_file(executable_path)
+    tracker.register_solution_hash(solution, solution_hash.hexdigest())
+    cached_results = {}
+    if context.use_cache:
+        with span("cache lookup", solution=solution.path):
+            cached_results = context.cache.get_test_results(solution.path, context.context_hash, solution_hash)
+
+    # cached results are registered first, so that no process is started before all of them are known
+    misses = []
     for test in tests:
-        io_hash = hash_file(test.input_path)
-        io_hash = hash_file(test.output_path, io_hash)
-
-        result = get_cached_test_result(solution.path, test.index,
-                                        context.context_hash, solution_hash, io_hash)
-
-        if context.use_cache and result is not None:
-            print(f"Result of {solution.path} on test {test.index} is cached, using cache...")
-            tracker.register_test_result(solution, test, result)
-            continue
-
-        time_limit_ms = context.time_limiter.get_time_limit_ms(test, solution)
-        exec_result = run_solution(context.task_config, 
-                                   working_dir,
-                                   solution,
-                                   solution.name,
-                                   test,
-                                   2 * time_limit_ms,
-                                   batchmanager_path=context.batchmanager_path)
-
-        if exec_result.returncode == -1:
-            result = TestResult(FailedVerdict.HardTimeLimitExceeded, exec_result.elapsed_time_ms, False)
-            cache_test_result(solution.path, test.index, context.context_hash, solution_hash, io_hash, result)
+        result = cached_results.get(io_hashes[test.index].hexdigest())
+        if result is not None:
+            print_verbose(f"Result of {solution.path} on test {test.index} is cached, using cache...")
             tracker.register_test_result(solution, test, result)
-            continue
-        elif exec_result.returncode != 0:
-            result = TestResult(FailedVerdict.RuntimeError, exec_result.elapsed_time_ms, False)
-            cache_test_result(solution.path, test.index, context.context_hash, solution_hash, io_hash, result)
-            tracker.register_test_result(solution, test, result)
-            continue
-
-        output_path = os.path.join(".etp", "output", "out")
-        with open(output_path, "wb") as out_stream:
-            out_stream.write(exec_result.output)
+            if context.fast_fail is not None:
+                context.fast_fail.register_test_result(solution, test, result)
+        else:
+            misses.append(test)
+
+    if context.test_order is not None:
+        misses = context.test_order.order(solution, misses)
+
+    pending = []
+    for test in misses:
+        future = executor.submit(run_test, solution, context, test, executable_path, workspaces)
+        pending.append(PendingTestResult(solution, test, solution_hash, io_hashes[test.index], future))
+
+    return pending
+
+
+def collect_test_results(pending: List[PendingTestResult], context: TestingContext, tracker: TestResultTracker):
+    # results are registered as soon as they finish, so that progress is shown as it happens
+    items = {item.future: item for item in pending}
+    for future in as_completed(items):
+        item = items[future]
+        result = future.result()
+        if result.verdict != FailedVerdict.Skipped:  # a later run may have to run it
+            with span("cache write", solution=item.solution.path, test=item.test.index):
+                context.cache.put_test_result(item.solution.path, item.test.index,
+                                              context.context_hash, item.solution_hash, item.io_hash, result)
+        tracker.register_test_result(item.solution, item.test, result)
+
+
+def run_test(solution: SolutionDescriptor,
+             context: TestingContext,
+             test: Test,
+             executable_path: str,
+             workspaces: WorkspacePool) -> TestResult:
+    # one span per (solution, test), containing the spans of running and checking it
+    with span("test", solution=solution.path, test=test.index):
+        if context.fast_fail is None:
+            return execute_test(solution, context, test, executable_path, workspaces)
+
+        # checked when the test is about to start, tests that finished in the meantime count too
+        if context.fast_fail.can_skip(solution, test):
+            return TestResult(FailedVerdict.Skipped, comment="skipped, its subtasks already scored 0")
+        result = execute_test(solution, context, test, executable_path, workspaces)
+        context.fast_fail.register_test_result(solution, test, result)
+        return result
+
+
+def execute_test(solution: SolutionDescriptor,
+                 context: TestingContext,
+                 test: Test,
+                 executable_path: str,
+                 workspaces: WorkspacePool) -> TestResult:
+    time_limit_ms = context.time_limiter.get_time_limit_ms(test, solution)
+    with workspaces.acquire() as workspace:
+        run = partial(run_solution,
+                      context.task_config,
+                      workspace.working_dir,
+                      solution,
+                      os.path.relpath(executable_path, workspace.working_dir),
+                      test,
+                      workspace.output_path,
+                      2 * time_limit_ms,
+                      batchmanager_path=context.batchmanager_path,
+                      memory_limit_mb=context.task_config.memory_limit)
+
+        exec_result = run()
+        failure = get_run_failure(exec_result)
+        if failure is not None:
+            return failure
+
+        # a single measurement close to the limit may fall on either side of it, so such tests are run
+        # again and judged by the median time
+        samples = [exec_result.elapsed_time_ms]
+        if context.repeat > 1 and abs(exec_result.elapsed_time_ms - time_limit_ms) <= REPEAT_MARGIN * time_limit_ms:
+            print_verbose(f"Time is close to the limit, running {context.repeat - 1} more times...")
+            for _ in range(context.repeat - 1):
+                exec_result = run()
+                failure = get_run_failure(exec_result)
+                if failure is not None:
+                    return failure
+                samples.append(exec_result.elapsed_time_ms)
+
+        if context.checker_pool is None:
+            return check_output(context, test, exec_result, exec_result.output_path, time_limit_ms, samples)
+
+        # moved out of the workspace, so that the next test can run there while this one is checked
+        fd, output_path = tempfile.mkstemp(dir=os.path.join(".etp", "output"), prefix="check")
+        os.close(fd)
+        os.replace(exec_result.output_path, output_path)
 
-        with open(test.output_path, "rb") as ans_stream:
-            ans_bytes = ans_stream.read()
-
-        exact_match = ans_bytes == exec_result.output
-
-        original_score = None
-        verdict, message = context.checker.execute_checker(test, output_path)
-        if isinstance(verdict, float):
-            original_score = verdict
-        if exec_result.elapsed_time_ms > time_limit_ms:
-            verdict = FailedVerdict.TimeLimitExceeded
-
-        print(f"Verdict: {verdict}, elapsed: {exec_result.elapsed_time_ms}, exact match: {exact_match}")
-        result = TestResult(verdict, exec_result.elapsed_time_ms, exact_match, message, original_score)
-        cache_test_result(solution.path, test.index, context.context_hash, solution_hash, io_hash, result)
-        tracker.register_test_result(solution, test, result)
+    try:
+        return context.checker_pool.submit(check_output, context, test, exec_result,
+                                           output_path, time_limit_ms, samples).result()
+    finally:
+        os.remove(output_path)
+
+
+def get_run_failure(exec_result: RunResult) -> Optional[TestResult]:
+    if exec_result.timed_out:
+        return TestResult(FailedVerdict.HardTimeLimitExceeded, exec_result.elapsed_time_ms, False,
+                          memory_kb=exec_result.memory_kb)
+    elif exec_result.memory_limit_exceeded:
+        return TestResult(FailedVerdict.MemoryLimitExceeded, exec_result.elapsed_time_ms, False,
+                          memory_kb=exec_result.memory_kb)
+    elif exec_result.returncode != 0:
+        return TestResult(FailedVerdict.RuntimeError, exec_result.elapsed_time_ms, False,
+                          memory_kb=exec_result.memory_kb)
+    return None
+
+
+def check_output(context: TestingContext, test: Test, exec_result: RunResult,
+                 output_path: str, time_limit_ms: int, samples: List[int]) -> TestResult:
+    with span("output comparison", test=test.index):
+        difference = describe_difference(test.output_path, output_path)
+    exact_match = difference is None
+
+    original_score = None
+    with span("checker execution", test=test.index):
+        checker_result = context.checker.execute_checker(test, output_path, exact_match)
+    verdict, message = checker_result.verdict, checker_result.message
+    if isinstance(verdict, float):
+        original_score = verdict
+    if difference is not None:
+        message = difference if not message else f"{message} ({difference})"
+
+    time_ms = int(statistics.median(samples))
+    time_min_ms, time_spread_ms = None, None
+    if len(samples) > 1:
+        time_min_ms, time_spread_ms = min(samples), max(samples) - min(samples)
+        message = f"{(message or '').rstrip()} (times of {len(samples)} runs: {', '.join(map(str, samples))} ms)"
+    if time_ms > time_limit_ms:
+        verdict = FailedVerdict.TimeLimitExceeded
+
+    print_verbose(f"Verdict: {verdict}, elapsed: {time_ms}, exact match: {exact_match}")
+    return TestResult(verdict, time_ms, exact_match, message, original_score,
+                      exec_result.memory_kb, checker_result.cpu_time_ms, time_min_ms, time_spread_ms)
@@ -1,19 +1,27 @@
 import itertools
 import os.path
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Tuple, Any, Union
 
 from tabulate import tabulate, SEPARATING_LINE
 
 from etp.common.solution_descriptor import get_solution_descriptor, SolutionDescriptor
 from etp.common.test import Test
+from etp.common.workspace import WorkspacePool
 from etp.config.genfile import Genfile
 from etp.config.make_all import make_all_check
 from etp.config.task_config import TaskConfig
 from etp.etp_exception import UnsupportedLanguageException
 from etp.print_utils import yellow_bold
+from etp.profiling import span
+from etp.testing.cache.cache import Cache
 from etp.testing.cache.hashing import hash_string, hash_file
 from etp.testing.cms_checker_executor import CmsCheckerExecutor
+from etp.testing.fast_fail import FastFailTracker
 from etp.testing.format_result import format_result, format_subtask_result, format_total_result
+from etp.testing.progress import ProgressView
+from etp.testing.result_export import ResultWriter, JsonRecordFormat, CsvRecordFormat
 from etp.testing.scoretypes.GroupMin import GroupMin
 from etp.testing.scoretypes.GroupMul import GroupMul
 from etp.testing.scoretypes.GroupSum import GroupSum
@@ -22,9 +30,10 @@ from etp.testing.scoretypes.GroupSumCond import GroupSumCond
 from etp.testing.scoretypes.ScoreType import ScoreType
 from etp.testing.scoretypes.adapters import Evaluation, SubmissionResult
 from etp.common.tabulate_hack import monkey_patch_tabulate
+from etp.testing.test_order import HistoryTestOrder
 from etp.testing.test_result import TestResult
 from etp.testing.test_result_tracker import TestResultTracker
-from etp.testing.test_solution import test_solution
+from etp.testing.test_solution import compile_for_testing, test_solution, collect_test_results
 from etp.testing.testing_context import DiffChecker, TimeLimitProvider, TestingContext
 from etp.testing.verdict import FailedVerdict, get_value
 
@@ -83,7 +92,8 @@ def calculate_score(tests: List[Test], solution: SolutionDescriptor,
     evaluations = []
     for test in tests:
         result = tracker.get_result(solution, test)
-        evaluations.append(Evaluation(test.index, get_value(result.verdict), result.time_milliseconds, 0, ""))
+        evaluations.append(Evaluation(test.index, get_value(result.verdict), result.time_milliseconds,
+                                      result.memory_kb, ""))
 
     return scorer.compute_score(SubmissionResult(evaluations))
 
@@ -116,23 +126,44 @@ def create_subtask_table(tests: List[Test], solutions: List[SolutionDescriptor],
     return table
 
 
-def test_solutions(task_config: TaskConfig, genfile: Genfile, solutions: List[str], use_cache: bool = False):
+def print_time_summary(tracker: TestResultTracker):
+    # shows whether the solutions or the checker took most of the time
+    solution_time_ms = sum(result.time_milliseconds or 0 for result in tracker.results.values())
+    checker_time_ms = sum(result.checker_time_ms or 0 for result in tracker.results.values())
+    print(f"CPU time of the tests above: solutions {solution_time_ms / 1000:.2f} s, "
+          f"checker {checker_time_ms / 1000:.2f} s")
+
+
+def test_solutions(task_config: TaskConfig, genfile: Genfile, solutions: List[str], use_cache: bool = False,
+                   jobs: int = 1, fast_fail: bool = False, order: str = "gen", checker_jobs: int = 0,
+                   repeat: int = 1, output_json: str = None, output_csv: str = None, verbose: bool = False,
+                   compile_cache: bool = True):
     # context_hash should contain everything "global" that can change how solutions are tested:
     # this includes:
-    # - infile, outfile, time_limit, time_limit_interpreted
-    # - checker if exists
+    # - infile, outfile, time_limit, time_limit_interpreted, memory_limit
+    # - checker and its limits if exists
     # - batchmanager if exists
     context_hash = hash_string(f"infile: {task_config.infile}, "
                                f"outfile: {task_config.outfile}, "
                                f"time_limit: {task_config.time_limit}, "
-                               f"time_limit_interpreted: {task_config.time_limit_interpreted}")
+                               f"time_limit_interpreted: {task_config.time_limit_interpreted}, "
+                               f"memory_limit: {task_config.memory_limit}")
 
-    make_all_check()
+    with span("make_all_check"):
+        make_all_check()
     if os.path.isfile(os.path.join("check", "checker")):
-        checker = CmsCheckerExecutor(os.path.join("check", "checker"))
+        checker = CmsCheckerExecutor(os.path.join("check", "checker"), time_limit=task_config.checker_time_limit,
+                                     memory_limit_mb=task_config.checker_memory_limit)
         context_hash = hash_file(os.path.join("check", "checker"), context_hash)
+        context_hash = hash_string(f"checker_time_limit: {task_config.checker_time_limit}, "
+                                   f"checker_memory_limit: {task_config.checker_memory_limit}", context_hash)
     else:
-        checker = DiffChecker()
+        checker = DiffChecker(task_config.float_tolerance)
+        if task_config.float_tolerance is not None:
+            context_hash = hash_string(f"float_tolerance: {task_config.float_tolerance}", context_hash)
+
+    if repeat > 1:
+        context_hash = hash_string(f"repeat: {repeat}", context_hash)
 
     batchmanager_path = None
     if os.path.isfile(os.path.join("check", "batchmanager")):
@@ -140,30 +171,93 @@ def test_solutions(task_config: TaskConfig, genfile: Genfile, solutions: List[st
         context_hash = hash_file(os.path.join("check", "batchmanager"), context_hash)
 
     time_limiter = TimeLimitProvider(task_config)
-    testing_context = TestingContext(checker, time_limiter, task_config, context_hash, 
-                                     use_cache=use_cache, batchmanager_path=batchmanager_path)
-
-    tracker = TestResultTracker()
-
-    descriptors = []
-    for solution in solutions:
-        try:
-            descriptor = get_solution_descriptor(solution)
-            descriptors.append(descriptor)
-        except UnsupportedLanguageException:
-            print(f"Unsupported language in solution {solution}")
-            descriptor = SolutionDescriptor(solution, None, None)
-            descriptors.append(descriptor)
-            tracker.register_compile_time_fail(descriptor, TestResult(FailedVerdict.UnsupportedLanguage))
-            continue
+    scorer = get_scorer(task_config, genfile)
 
-        test_solution(descriptor, testing_context, genfile.tests, tracker)
+    fast_fail_tracker = None
+    if fast_fail:
+        if isinstance(scorer, (GroupMin, GroupMul)):
+            fast_fail_tracker = FastFailTracker(genfile)
+        else:
+            print(yellow_bold("WARN:"), "--fast-fail only works with GroupMin and GroupMul, all tests will be run")
 
-    result_table = create_table(genfile, descriptors, tracker)
+    tracker = TestResultTracker()
+    # every record is flushed right away, so the files have all results so far even if the run crashes
+    writers = []
+    if output_json:
+        writers.append(ResultWriter(output_json, genfile, JsonRecordFormat))
+    if output_csv:
+        writers.append(ResultWriter(output_csv, genfile, CsvRecordFormat))
+    for writer in writers:
+        tracker.add_listener(writer)
 
-    scorer = get_scorer(task_config, genfile)
-    subtask_table = create_subtask_table(genfile.tests, descriptors, scorer, tracker, genfile)
+    workspaces = WorkspacePool(jobs)
 
-    monkey_patch_tabulate()
-    print(tabulate(result_table, headers="firstrow", tablefmt="fancy_grid"))
-    print(tabulate(subtask_table, headers="firstrow", tablefmt="fancy_grid"))
+    descriptors = []
+    # with --verbose, every test is printed instead
+    progress = ProgressView(genfile, descriptors,
+                            lambda descriptor: calculate_score(genfile.tests, descriptor, tracker, scorer)[0],
+                            live=sys.stdout.isatty() and not verbose)
+    if not verbose:
+        tracker.add_listener(progress)
+
+    pending = []
+    # with checker_jobs, a test's thread waits for the checker pool after giving its workspace
+    # to the next test, so there have to be more threads than workspaces
+    # the live view is removed only after all threads that may print have finished
+    with progress, \
+            Cache(hash_algorithm=task_config.hash_algorithm) as cache, \
+            ThreadPoolExecutor(max_workers=jobs + checker_jobs) as executor, \
+            ThreadPoolExecutor(max_workers=max(checker_jobs, 1)) as checker_pool:
+        testing_context = TestingContext(checker, time_limiter, task_config, context_hash, cache,
+                                         use_cache=use_cache, batchmanager_path=batchmanager_path,
+                                         fast_fail=fast_fail_tracker,
+                                         checker_pool=checker_pool if checker_jobs > 0 else None,
+                                         repeat=repeat)
+        if isinstance(checker, CmsCheckerExecutor) and use_cache:
+            checker.cache = cache  # verdicts on identical outputs are reused, like everything else only with -c
+
+        # the same for every solution, so the files are hashed (at most) once
+        with span("hashing"):
+            io_hashes = {test.index: cache.get_io_hash(test) for test in genfile.tests}
+        if order == "history":
+            testing_context.test_order = HistoryTestOrder(cache, io_hashes, jobs)
+
+        compilable = []
+        for solution in solutions:
+            try:
+                descriptor = get_solution_descriptor(solution)
+                descriptors.append(descriptor)
+                compilable.append(descriptor)
+            except UnsupportedLanguageException:
+                print(f"Unsupported language in solution {solution}")
+                descriptor = SolutionDescriptor(solution, None, None)
+                descriptors.append(descriptor)
+                tracker.register_compile_time_fail(descriptor, TestResult(FailedVerdict.UnsupportedLanguage))
+
+        # all solutions are compiled at the same time, and the tests of each one are scheduled
+        # as soon as it is compiled; (solution, test) pairs then run in the background
+        with ThreadPoolExecutor(max_workers=jobs) as compile_executor:
+            compiles = {compile_executor.submit(compile_for_testing, descriptor, tracker, compile_cache): descriptor
+                        for descriptor in compilable}
+            for future in as_completed(compiles):
+                executable_path = future.result()
+                if executable_path is not None:
+                    pending += test_solution(compiles[future], executable_path, testing_context, genfile.tests,
+                                             io_hashes, tracker, executor, workspaces)
+
+        collect_test_results(pending, testing_context, tracker)
+
+    with span("rendering"):
+        result_table = create_table(genfile, descriptors, tracker)
+
+        subtask_table = create_subtask_table(genfile.tests, descriptors, scorer, tracker, genfile)
+
+        monkey_patch_tabulate()
+        print(tabulate(result_table, headers="firstrow", tablefmt="fancy_grid"))
+        print(tabulate(subtask_table, headers="firstrow", tablefmt="fancy_grid"))
+        print_time_summary(tracker)
+
+    for writer in writers:
+        for descriptor in descriptors:
+            writer.write_score(descriptor, *calculate_score(genfile.tests, descriptor, tracker, scorer))
+        writer.close()
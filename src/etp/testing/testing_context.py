@@ -1,27 +1,50 @@
-import subprocess
+from concurrent.futures import Executor
 from dataclasses import dataclass
-from typing import Protocol, Tuple, Any
+from typing import Protocol, Any
 
+from etp.common.compare import lines_match, tokens_match
 from etp.common.solution_descriptor import SolutionDescriptor
 from etp.common.test import Test
 from etp.config.task_config import TaskConfig
+from etp.testing.cache.cache import Cache
+from etp.testing.fast_fail import FastFailTracker
+from etp.testing.test_order import HistoryTestOrder
 from etp.testing.verdict import Verdict
 
 
+@dataclass
+class CheckerResult:
+    verdict: Verdict
+    message: str
+    cpu_time_ms: int = 0  # time spent checking, 0 if no process was started
+
+
 class CheckerExecutor(Protocol):
-    # TODO should checkers have time limits?
-    def execute_checker(self, test: Test, output_path: str) -> Tuple[Verdict, str]:
+    # exact_match: the output is already known to be byte for byte the same as the correct one
+    def execute_checker(self, test: Test, output_path: str, exact_match: bool = False) -> CheckerResult:
         ...
 
 
 class DiffChecker(CheckerExecutor):
-    def execute_checker(self, test: Test, output_path: str) -> Tuple[Verdict, str]:
-        exec_result = subprocess.run(["diff", "-q", "--ignore-trailing-space", "--strip-trailing-cr",
-                                      test.output_path, output_path])
-        if exec_result.returncode == 0:
-            return 1.0, "exact match up to trailing whitespace"
+    # runs in-process: starting `diff` for every test used to cost more than small tests themselves
+    def __init__(self, float_tolerance: float = None):
+        self.float_tolerance = float_tolerance
+
+    def execute_checker(self, test: Test, output_path: str, exact_match: bool = False) -> CheckerResult:
+        if self.float_tolerance is not None:
+            if exact_match:
+                return CheckerResult(1.0, f"all tokens match (tolerance {self.float_tolerance})")
+            mismatch = tokens_match(test.output_path, output_path, self.float_tolerance)
+            if mismatch is None:
+                return CheckerResult(1.0, f"all tokens match (tolerance {self.float_tolerance})")
+            else:
+                return CheckerResult(0.0, f"wrong answer: {mismatch}")
+
+        # the files aren't read again if they are known to be identical
+        if exact_match or lines_match(test.output_path, output_path):
+            return CheckerResult(1.0, "exact match up to trailing whitespace")
         else:
-            return 0.0, "wrong answer"
+            return CheckerResult(0.0, "wrong answer")
 
 
 class TimeLimitProvider:
@@ -43,5 +66,10 @@ class TestingContext:
     time_limiter: TimeLimitProvider
     task_config: TaskConfig
     context_hash: Any
+    cache: Cache = None
     use_cache: bool = False
     batchmanager_path: str = None
+    fast_fail: FastFailTracker = None  # set with --fast-fail
+    test_order: HistoryTestOrder = None  # set with --order history, otherwise tests run in GEN order
+    checker_pool: Executor = None  # if set, outputs are checked there instead of in the test's thread
+    repeat: int = 1  # how many times tests close to the time limit are run
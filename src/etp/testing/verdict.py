@@ -10,6 +10,7 @@ class FailedVerdict(Enum):
     JudgementFailed = 5  # e.g. checker crash
     UnsupportedLanguage = 6
     HardTimeLimitExceeded = 7  # TL exceeded, terminated before finish
+    Skipped = 8  # not run, its subtasks were already failed (--fast-fail)
 
 
 Verdict = Union[float, FailedVerdict]
@@ -1,12 +1,16 @@
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List
 
 from etp.config.genfile import Genfile
 from etp.config.make_all import make_all_gen
 from etp.config.task_config import TaskConfig
 from etp.print_utils import red_bold, yellow_bold
+from etp.profiling import span
 
 
-def validate_all(task_config: TaskConfig, genfile: Genfile) -> bool:
+def validate_all(task_config: TaskConfig, genfile: Genfile, jobs: int = 1) -> bool:
     if not task_config.validator:
         print(yellow_bold("No validator set, skipping test case validation..."))
         return True
@@ -16,11 +20,14 @@ def validate_all(task_config: TaskConfig, genfile: Genfile) -> bool:
     # tests are validated with the name of the group they are originally in
     # problemsetters should ensure that conditions of a subtask imply the conditions of its dependencies
     is_ok = True
-    for test in genfile.tests:
-        print(f"Validating test {test.index}...")
-        ok = validate_core(task_config.validator, test.input_path, test.original_group_name)
-        if not ok:
-            is_ok = False
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(lambda t: run_validator(task_config.validator, t.input_path, t.original_group_name),
+                               genfile.tests)
+        # map yields the results in test order, so the log reads the same as a serial run
+        for test, result in zip(genfile.tests, results):
+            print(f"Validating test {test.index}...")
+            if not print_validator_result(result):
+                is_ok = False
 
     return is_ok
 
@@ -53,21 +60,38 @@ def validate_test_in_file(input_path: str, task_config: TaskConfig) -> bool:
     return validate_core(task_config.validator, input_path)
 
 
+@dataclass
+class ValidatorResult:
+    command: List[str]
+    returncode: int
+    stderr: str
+
+
 def validate_core(validator_path: str, input_path: str, group_name: str = None) -> bool:
+    return print_validator_result(run_validator(validator_path, input_path, group_name))
+
+
+def run_validator(validator_path: str, input_path: str, group_name: str = None) -> ValidatorResult:
     command = [validator_path]
     if group_name is not None and group_name != "":
         command.append("--group")
         command.append(group_name)
 
-    with open(input_path, "r") as input_text:
-        print(" ".join(command))
+    # the validator reads the input file directly, it is never loaded into memory here
+    with open(input_path, "rb") as input_file, span("validator", input=input_path):
         exec_result = subprocess.run(command,
-                                     text=True,
-                                     capture_output=True,
-                                     input=input_text.read())
-        if exec_result.returncode != 0:
-            print(red_bold("FAILED:"), exec_result.stderr)
-            return False
-        else:
-            print(exec_result.stderr)
-            return True
+                                     stdin=input_file,
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE)
+
+    return ValidatorResult(command, exec_result.returncode, exec_result.stderr.decode(errors="replace"))
+
+
+def print_validator_result(result: ValidatorResult) -> bool:
+    print(" ".join(result.command))
+    if result.returncode != 0:
+        print(red_bold("FAILED:"), result.stderr)
+        return False
+    else:
+        print(result.stderr)
+        return True